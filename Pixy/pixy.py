@@ -0,0 +1,77 @@
+""" Read all values of Pixy for LEGO Mindstorms at once."""
+import os
+import struct
+
+# Formats of bin_data (see ev3dev documentation for sensors)
+BIN_DATA_FORMATS = {
+    'u8': '<B',
+    's8': '<b',
+    'u16': '<H',
+    's16': '<h',
+    's16_be': '>h',
+    's32': '<i',
+    's32_be': '>i',
+    'float': '<f',
+    }
+# Directory of the sensors in sysfs
+SENSOR_CLASS = '/sys/class/lego-sensor'
+
+
+def sensor_path(sensor):
+    """Return sysfs directory of sensor, None when it isn't found.
+
+    ev3dev2 doesn't offer the path of a sensor as public attribute, so it's
+    looked up with the address (port) of the sensor.
+    """
+    address = sensor.address
+    try:
+        names = sorted(os.listdir(SENSOR_CLASS))
+    except OSError:
+        return None
+    for name in names:
+        path = os.path.join(SENSOR_CLASS, name)
+        try:
+            with open(os.path.join(path, 'address')) as f:
+                if f.read().strip() == address:
+                    return path
+        except OSError:
+            pass
+    return None
+
+
+class PixyReader:
+    """Read the values of Pixy from its bin_data attribute.
+
+    Reading pixy.value(n) for every value opens and reads a sysfs file for
+    each value, and the values can belong to different frames of the
+    camera. PixyReader reads all values with one read of bin_data, so they
+    always belong to the same frame. When bin_data of the sensor isn't
+    found, the values are read with pixy.value(n) instead.
+    """
+    def __init__(self, sensor):
+        self.sensor = sensor
+        self._fd = None
+        self.update_mode()
+
+    def update_mode(self):
+        """Update the format of the data, call after changing the mode."""
+        fmt = BIN_DATA_FORMATS[self.sensor.bin_data_format]
+        self._num_values = self.sensor.num_values
+        self._struct = struct.Struct(fmt[0] + fmt[1] * self._num_values)
+        if self._fd is None:
+            path = sensor_path(self.sensor)
+            if path is not None:
+                self._fd = os.open(os.path.join(path, 'bin_data'),
+                                   os.O_RDONLY)
+
+    def read(self):
+        """Return all values, in the same order as pixy.value(n)."""
+        if self._fd is None:
+            return tuple(self.sensor.value(n)
+                         for n in range(self._num_values))
+        return self._struct.unpack(os.pread(self._fd, self._struct.size, 0))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -17,13 +17,30 @@
     website: kwsmit.github.io
 '''
 
-from time import sleep
+import os
+import sys
+from time import monotonic
 
 from ev3dev2.sensor import Sensor, INPUT_1, INPUT_4
 from ev3dev2.sensor.lego import TouchSensor
 from ev3dev2.motor import LargeMotor, OUTPUT_A, OUTPUT_B
 from ev3dev2.port import LegoPort
 
+from pixy import PixyReader
+# Modules shared by the examples, in the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..'))
+from common.startup import Startup, wait_until
+from common.scheduler import Scheduler
+from common.motors import MotorCommand
+from common.tracker import TargetTracker
+from common.realtime import RealTime
+from common.telemetry import Telemetry
+
+# Measure how long each phase of starting takes
+startup = Startup()
+startup.phase('imports')
+
 
 def limit_speed(speed):
     """ Limit speed in range [-1000,1000] """
@@ -36,13 +53,14 @@ def limit_speed(speed):
 # Set LEGO port for Pixy on input port 1
 in1 = LegoPort(INPUT_1)
 in1.mode = 'auto'
-# Wait 2 secs for the port to get ready
-sleep(2)
 
-# Connect Pixy camera
-pixy = Sensor(INPUT_1)
+# Connect Pixy camera, as soon as the port detected it
+pixy = wait_until(lambda: Sensor(INPUT_1, driver_name='pixy-lego'))
 # Set mode to detect signature 1 only
 pixy.mode = 'SIG1'
+# Read all values of a frame at once
+reader = PixyReader(pixy)
+startup.phase('pixy')
 
 # Signatures we're interested in (SIG1)
 sig = 1
@@ -50,9 +68,11 @@ sig = 1
 # Connect TouchSensor (to stop script)
 ts = TouchSensor(INPUT_4)
 
-# Connect LargeMotors
-rmotor = LargeMotor(OUTPUT_A)
-lmotor = LargeMotor(OUTPUT_B)
+# Connect LargeMotors, only send changed commands to them
+rmotor = MotorCommand(LargeMotor(OUTPUT_A))
+lmotor = MotorCommand(LargeMotor(OUTPUT_B))
+startup.phase('sensors and motors')
+startup.dump()
 
 # Defining constants
 X_REF = 128  # X-coordinate of referencepoint
@@ -61,6 +81,8 @@ KP = 0.4     # Proportional constant PID-controller
 KI = 0.01    # Integral constant PID-controller
 KD = 0.05    # Derivative constant PID-controller
 GAIN = 10    # Gain for motorspeed
+LOOP_FREQUENCY = 50  # Loops per second, PID constants depend on it
+LEAD = 0.05  # Seconds to look ahead, to lead a moving target
 
 # Initializing PID variables
 integral_x = 0
@@ -73,11 +95,41 @@ last_dy = 0
 # Data for requesting block
 data = [174, 193, 32, 2, sig, 1]
 
+# Estimate position of SIG1-object between frames and when it's missing
+# in a few frames
+tracker = TargetTracker()
+last_values = None
+
+# Run control loop at a fixed rate
+scheduler = Scheduler(LOOP_FREQUENCY)
+# Stream target, PID-controller and motors to a computer (see telemetry.py)
+telemetry = Telemetry()
+telemetry.start()
+# Real-time mode (garbage collection in slack time, high priority) with
+# the argument --realtime
+realtime = RealTime(enabled='--realtime' in sys.argv)
+realtime.enter()
+scheduler.idle = realtime.idle
+
 while not ts.value():
-    if pixy.value(0) > 0:
+    scheduler.wait()
+    # Number of SIG1-objects and X/Y-centroid of largest SIG1-object
+    values = reader.read()
+    now = monotonic()
+    count, x, y, w = values[:4]
+    if count > 0:
+        if values != last_values:
+            # SIG1-object in a new frame
+            tracker.update(x, y, w, now)
+        else:
+            # Same values as the previous frame, SIG1-object is still there
+            tracker.seen(now)
+    last_values = values
+    # Estimated position of SIG1-object, a little ahead in time
+    target = tracker.predict(now + LEAD)
+    if target is not None:
         # SIG1 detected, control motors
-        x = pixy.value(1)               # X-centroid of largest SIG1-object
-        y = pixy.value(2)               # Y-centroid of largest SIG1-object
+        x, y = target[:2]
         dx = X_REF - x                  # Error in reference to X_REF
         integral_x = integral_x + dx    # Calculate integral for PID
         derivative_x = dx - last_dx     # Calculate derivative for PID
@@ -91,17 +143,24 @@ while not ts.value():
         # but limit in range [-900,900]
         rspeed = limit_speed(GAIN*(speed_y - speed_x))
         lspeed = limit_speed(GAIN*(speed_y + speed_x))
-        rmotor.run_forever(speed_sp = round(rspeed))
-        lmotor.run_forever(speed_sp = round(lspeed))
+        rmotor.run(rspeed)
+        lmotor.run(lspeed)
         last_dx = dx                    # Set last error for x
         last_dy = dy                    # Set last error for y
+        telemetry.publish(x, y, dx, integral_x, derivative_x, speed_x,
+                          rspeed, lspeed)
     else:
-        # SIG1 not detected, stop motors
+        # SIG1 not detected for a while, stop motors
         rmotor.stop()
         lmotor.stop()
         last_dx = 0
         last_dy = 0
+        telemetry.publish(None, None)
 
 # TouchSensor pressed, stop motors
 rmotor.stop()
 lmotor.stop()
+realtime.exit()
+telemetry.stop()
+print(scheduler.report())
+print(realtime.report())
@@ -20,16 +20,31 @@
     website: kwsmit.github.io
 '''
 
-from time import sleep
+import os
+import sys
 
 from ev3dev2.display import Display
 from ev3dev2.sensor import Sensor, INPUT_1, INPUT_4
 from ev3dev2.sensor.lego import TouchSensor
 from ev3dev2.port import LegoPort
 
+from pixy import PixyReader
+# Modules shared by the examples, in the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..'))
+from common.startup import Startup, wait_until
+from common.display import BoxDisplay
+from common.camera import CameraStream, PixyCamera
 
-# EV3 Display
+# Measure how long each phase of starting takes
+startup = Startup()
+startup.phase('imports')
+
+
+# EV3 Display, only redrawn when the rectangle moves
 lcd = Display()
+box_display = BoxDisplay(lcd)
+startup.phase('display')
 
 # Connect TouchSensor
 ts = TouchSensor(INPUT_4)
@@ -37,38 +52,52 @@ ts = TouchSensor(INPUT_4)
 # Set LEGO port for Pixy on input port 1
 in1 = LegoPort(INPUT_1)
 in1.mode = 'auto'
-# Wait 2 secs for the port to get ready
-sleep(2)
 
-# Connect Pixy camera
-pixy = Sensor(INPUT_1)
+# Connect Pixy camera, as soon as the port detected it
+pixy = wait_until(lambda: Sensor(INPUT_1, driver_name='pixy-lego'))
 # Set mode to detect signature 1 only
 pixy.mode = 'SIG1'
+sig = 1
+# Read all values of a frame at once
+reader = PixyReader(pixy)
+startup.phase('pixy')
+startup.dump()
+
+# Read frames with the detected object in the background, only the latest
+# frame is used
+camera = CameraStream(PixyCamera(reader, sig))
+camera.start()
 
-# Read and display data until TouchSensor is pressed
-while not ts.value():
-    # Clear EV3 display
-    lcd.clear()
-    # Read values from Pixy
-    x = pixy.value(1)     # X-coordinate of centerpoint of object
-    y = pixy.value(2)     # Y-coordinate of centerpoint of object
-    w = pixy.value(3)     # Width of rectangle around detected object
-    h = pixy.value(4)     # Heigth of rectangle around detected object
-    # scale to resolution of EV3 display:
-    # Resolution Pixy while color tracking; (255x199)
-    # Resolution EV3 display: (178x128)
-    x *= 0.7
-    y *= 0.6
-    w *= 0.7
-    h *= 0.6
-    # Calculate reactangle to draw on EV3-display
-    dx = int(w/2)         # Half of the width of the rectangle
-    dy = int(h/2)         # Half of the height of the rectangle
-    xa = x - dx           # X-coordinate of top-left corner
-    ya = y + dy           # Y-coordinate of the top-left corner
-    xb = x + dx           # X-coordinate of bottom-right corner
-    yb = y - dy           # Y-coordinate of the bottom-right corner
-    # Draw rectangle on display
-    lcd.draw.rectangle((xa, ya, xb, yb), fill='black')
-    # Updats display to show rectangle
-    lcd.update()
+# Display new frames until TouchSensor is pressed
+boxes = []
+for frame in camera.frames(timeout=0.1):
+    if ts.value():
+        break
+    if frame is None:
+        # No new frame within 0.1 s, show the last boxes again: the display
+        # skips changes that come too soon after the previous update
+        box_display.show(boxes)
+        continue
+    # No rectangle when no object is detected
+    boxes = []
+    for detection in frame.detections:
+        # X/Y-coordinate of centerpoint of object and
+        # width/height of rectangle around detected object,
+        # scaled to resolution of EV3 display:
+        # Resolution Pixy while color tracking; (255x199)
+        # Resolution EV3 display: (178x128)
+        x = detection.x * 0.7
+        y = detection.y * 0.6
+        w = detection.width * 0.7
+        h = detection.height * 0.6
+        # Calculate reactangle to draw on EV3-display
+        dx = int(w/2)         # Half of the width of the rectangle
+        dy = int(h/2)         # Half of the height of the rectangle
+        xa = x - dx           # X-coordinate of top-left corner
+        ya = y + dy           # Y-coordinate of the top-left corner
+        xb = x + dx           # X-coordinate of bottom-right corner
+        yb = y - dy           # Y-coordinate of the bottom-right corner
+        boxes.append((xa, ya, xb, yb))
+    # Show rectangle on display
+    box_display.show(boxes)
+camera.stop()
@@ -0,0 +1,69 @@
+""" Background acquisition of linetracking data from Pixy2."""
+from threading import Lock, Thread
+from time import sleep
+
+from common.pixy2 import MainFeatures
+
+
+class FrameGrabber(Thread):
+    """Read linetracking data from Pixy2 in a background thread.
+
+    The thread fills its own MainFeatures and then swaps it with the latest
+    frame. latest() swaps the latest frame with the frame of the caller,
+    so a frame is never changed while it is being used. The lock is only
+    held for swapping the frames, not while reading from Pixy2. Frames
+    with errors (also I2C errors) are not published, they are only
+    counted, and then the thread waits interval seconds. Frames with the
+    same data as the previous frame are not published either, and then
+    the thread waits interval seconds before reading again.
+    """
+    def __init__(self, pixy2, interval=0.004):
+        super().__init__(daemon=True)
+        self.pixy2 = pixy2
+        self.interval = interval
+        self._lock = Lock()
+        self._running = False
+        self.errors = 0
+        # Frame being read, latest frame and frame of the caller
+        self._back = MainFeatures()
+        self._middle = MainFeatures()
+        self._front = MainFeatures()
+        # Sequence numbers of the latest frame and the frame of the caller
+        self._sequence = 0
+        self._front_sequence = 0
+
+    def start(self):
+        self._running = True
+        super().start()
+
+    def run(self):
+        while self._running:
+            self.pixy2.getdata(self._back)
+            if self._back.error:
+                # Also I2C errors (often errno 121), try again after a while
+                self.errors += 1
+                sleep(self.interval)
+                continue
+            if not self._back.new:
+                sleep(self.interval)
+                continue
+            with self._lock:
+                self._back, self._middle = self._middle, self._back
+                self._sequence += 1
+
+    def latest(self):
+        """Return sequence number and newest frame.
+
+        The sequence number is 0 when no frame has been read yet, and
+        doesn't change when no new frame has been read since the last call.
+        """
+        with self._lock:
+            if self._front_sequence != self._sequence:
+                self._front, self._middle = self._middle, self._front
+                self._front_sequence = self._sequence
+        return self._front_sequence, self._front
+
+    def stop(self):
+        """Stop reading and wait for the thread to finish."""
+        self._running = False
+        self.join()
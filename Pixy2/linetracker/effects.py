@@ -0,0 +1,94 @@
+""" Sounds and leds of the robot, without waiting for them."""
+from threading import Condition, Thread
+from time import monotonic
+
+
+class Effects(Thread):
+    """Play sounds and set leds of robot in a background thread.
+
+    A beep blocks until it has been played and setting a led writes sysfs
+    attributes, so the control loop only tells what it wants and this
+    thread does the work. A led group is only set when its color changes,
+    only the last color is set when it changes faster than the thread can
+    follow. A beep is skipped while a beep is waiting, or when the previous
+    beep was less than beep_interval seconds ago.
+
+    Sounds and leds are taken from robot.sound and robot.leds. When
+    background is False, no thread is used and the effects are done right
+    away (for simulation).
+    """
+    def __init__(self, robot, beep_interval=0.5, background=True):
+        super().__init__(daemon=True)
+        self.robot = robot
+        self.beep_interval = beep_interval
+        self.background = background
+        self._condition = Condition()
+        self._running = False
+        # Wanted and actual color of each led group
+        self._colors = {}
+        self._set_colors = {}
+        self._beep = False
+        self._beep_time = None
+        self.skipped_beeps = 0
+
+    def start(self):
+        if self.background:
+            self._running = True
+            super().start()
+
+    def beep(self):
+        """Beep, unless the robot beeped less than beep_interval ago."""
+        now = monotonic()
+        with self._condition:
+            if self._beep or (self._beep_time is not None
+                              and now - self._beep_time < self.beep_interval):
+                self.skipped_beeps += 1
+                return
+            self._beep = True
+            self._beep_time = now
+            self._condition.notify()
+        if not self.background:
+            self._apply()
+
+    def set_color(self, group, color):
+        """Set color of led group ('LEFT' or 'RIGHT')."""
+        with self._condition:
+            if self._colors.get(group) == color:
+                return
+            self._colors[group] = color
+            self._condition.notify()
+        if not self.background:
+            self._apply()
+
+    def _pending(self):
+        return self._beep or self._colors != self._set_colors
+
+    def _apply(self):
+        """Set changed leds and play waiting beep."""
+        with self._condition:
+            beep = self._beep
+            self._beep = False
+            changes = [(group, color) for group, color in self._colors.items()
+                       if self._set_colors.get(group) != color]
+            self._set_colors.update(changes)
+        for group, color in changes:
+            self.robot.leds.set_color(group, color)
+        if beep:
+            self.robot.sound.beep()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._pending():
+                    self._condition.wait()
+                if not self._pending():
+                    break
+            self._apply()
+
+    def stop(self):
+        """Finish waiting effects and stop the thread."""
+        if self._running:
+            with self._condition:
+                self._running = False
+                self._condition.notify()
+            self.join()
@@ -1,17 +1,31 @@
 #!/usr/bin/env python3
+import os
+import sys
 from math import degrees, atan2
-from time import sleep
+from time import monotonic
 
-from pixy2 import (
-    Pixy2,
-    MainFeatures,
+# Modules shared by the examples, in the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+from common.pixy2 import (
     BARCODE_DEACTIVATE,
     BARCODE_ACTIVATE,
     BARCODE_FORWARD,
     BARCODE_LEFT,
     BARCODE_RIGHT,
+    FEATURE_VECTOR,
+    FEATURE_BARCODE,
+    FEATURES_ALL,
     )
+from common.scheduler import Scheduler
+from common.startup import Startup, connect_pixy2
+from common.realtime import RealTime
+from common.telemetry import Telemetry
 from robot import Robot
+from acquisition import FrameGrabber
+from timing import Timings
+from recorder import FlightRecorder
+from trackmap import TrackMap, Navigator
 
 # Defining constants
 X_REF = 39   # X-center coordinate of view
@@ -19,29 +33,89 @@ Y_REF = 25   # Y-center coordinate of view
 KP = 0.6     # Proportional constant PID-controller
 KI = 0.0     # Integral constant PID-controller
 KD = 0.0     # Derivative constant PID-controller
+KF = 0.0     # Feedforward constant of the angle of the vector
+LOOP_FREQUENCY = 100  # Loops per second
+PID_PERIOD = 1.0 / 60  # Seconds between PID updates (a frame of Pixy2) that
+                       # KI and KD are meant for
+# Features to request from Pixy2, intersections only when one is in sight
+FEATURES_LINE = FEATURE_VECTOR | FEATURE_BARCODE
+FEATURES_INTERSECTION = FEATURES_ALL
+# Speed profile: full speed on straight lines, slower in curves
+SPEED_STRAIGHT = 500  # Basic speed when the vector points straight ahead
+SPEED_CURVE = 200     # Basic speed in the sharpest curves
+MAX_ANGLE = 60        # Angle (degrees) of the vector in the sharpest curves
+RATE_WEIGHT = 2       # Weight of the change of the angle per frame
+MAP_FILE = 'trackmap.json'  # Map of the intersections of the track
 
-ev3 = Robot()
-pixy2 = Pixy2()
-data = MainFeatures()
-start_intersection = False
-
-# Initializing PID variables
-integral_x = 0
-derivative_x = 0
-last_dx = 0
-
-# Toggle lamp pixy on
-pixy2.lamp_on()
-
-# Loop until TouchSensor is pressed
-while not ev3.touch_4.value():
-    # Get linetracking data from pixy2
-    data = pixy2.getdata()
-    # Process data
-    if data.error:
-        # data error, try reading again
-        ev3.sound.beep()
-    else:
+
+def curve_speed(angle, rate):
+    """Return basic speed for vector angle and its change per frame."""
+    curve = min(1.0, (abs(angle) + RATE_WEIGHT*abs(rate)) / MAX_ANGLE)
+    return SPEED_STRAIGHT - curve*(SPEED_STRAIGHT - SPEED_CURVE)
+
+
+class LineTracker:
+    """Control the robot with the linetracking data of Pixy2."""
+    def __init__(self, ev3, pixy2, kp=KP, ki=KI, kd=KD, kf=KF, timings=None,
+                 recorder=None, navigator=None, telemetry=None):
+        self.ev3 = ev3
+        self.pixy2 = pixy2
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.kf = kf
+        self.timings = timings
+        # Optional recorder.FlightRecorder for every processed frame
+        self.recorder = recorder
+        # Optional trackmap.Navigator, to map the track and follow routes
+        self.navigator = navigator
+        # Optional telemetry.Telemetry, to stream the control loop
+        self.telemetry = telemetry
+        self.start_intersection = False
+        # Initializing PID variables
+        self.integral_x = 0
+        self.derivative_x = 0
+        self.last_dx = 0
+        self.speed_x = 0
+        # Time of the last PID update, None after frames without vector
+        self.last_time = None
+        # Angle of the vector, 0 is straight ahead and positive to the left,
+        # None when the previous frame had no vector to compare with
+        self.last_angle = None
+        self.pixy2.set_features(FEATURES_LINE)
+
+    def process(self, data, now=None):
+        """Process one frame of linetracking data.
+
+        now is the time (seconds) of the frame. The integral and derivative
+        of the PID-controller are scaled by the time since the previous
+        frame, relative to PID_PERIOD. Without now, frames are PID_PERIOD
+        apart.
+        """
+        self._process(data, now)
+        if self.recorder is not None:
+            speed_a, speed_b = self.ev3.speeds()
+            self.recorder.record(data, self.last_dx, self.integral_x,
+                                 self.derivative_x, self.speed_x,
+                                 speed_a, speed_b)
+        telemetry = self.telemetry
+        if telemetry is not None and telemetry.listening:
+            speed_a, speed_b = self.ev3.speeds()
+            if data.number_of_vectors > 0:
+                # Head of the vector
+                x, y = data.vectors[0].x1, data.vectors[0].y1
+            else:
+                x, y = None, None
+            telemetry.publish(x, y, self.last_dx, self.integral_x,
+                              self.derivative_x, self.speed_x,
+                              speed_a, speed_b)
+
+    def _process(self, data, now):
+        ev3 = self.ev3
+        if data.error:
+            # No valid data, only when the caller reads Pixy2 itself: the
+            # frame grabber doesn't pass on frames with errors
+            return
         if data.number_of_barcodes > 0:
             # Barcode(s) found
             for i in range(0, data.number_of_barcodes):
@@ -50,41 +124,160 @@ while not ev3.touch_4.value():
                 elif data.barcodes[i].code == BARCODE_DEACTIVATE:
                     ev3.deactivate()
                 elif data.barcodes[i].code == BARCODE_RIGHT:
-                    pixy2.set_next_turn(-90)
+                    self._set_next_turn(-90, BARCODE_RIGHT)
                     ev3.set_leds_right()
                 elif data.barcodes[i].code == BARCODE_LEFT:
-                    pixy2.set_next_turn(90)
+                    self._set_next_turn(90, BARCODE_LEFT)
                     ev3.set_leds_left()
         if data.number_of_intersections > 0:
             # Intersection found
-            ev3.sound.beep()
+            ev3.beep()
+            if self.navigator is not None:
+                self.navigator.intersection(data.intersections[0])
+            # Vector follows another branch now, its angle jumps
+            self.last_angle = None
         if data.number_of_vectors > 0:
+            vector = data.vectors[0]
+            # Angle of the vector from bottom (x0, y0) to top (x1, y1)
+            angle = degrees(atan2(vector.x0 - vector.x1,
+                                  vector.y0 - vector.y1))
+            if self.last_angle is None:
+                # First vector after a gap or an intersection
+                rate = 0.0
+            else:
+                rate = angle - self.last_angle
+            self.last_angle = angle
             # Check for intersection
-            if data.vectors[0].flags == 4:
-                # Intersection in sight, so slow down not to miss it
-                ev3.move_slow()
-                start_intersection = True
+            if vector.flags == 4:
+                # Intersection in sight, so slow down not to miss it,
+                # unless the turn is known from the map
+                if self.navigator is None or not self.navigator.routing:
+                    ev3.move_slow()
+                else:
+                    ev3.set_speed(curve_speed(angle, rate))
+                self.pixy2.set_features(FEATURES_INTERSECTION)
+                self.start_intersection = True
             else:
-                # No intersection in sight, so fulll speed ahead
-                ev3.move_fast()
-                if start_intersection:
-                    start_intersection = False
+                # No intersection in sight, so as fast as the curve allows
+                ev3.set_speed(curve_speed(angle, rate))
+                self.pixy2.set_features(FEATURES_LINE)
+                if self.start_intersection:
+                    self.start_intersection = False
                     ev3.set_leds_default()
             # Calculate speed out of offset in X-coördinate, using PID
-            dx = X_REF - data.vectors[0].x1
-            integral_x += dx
-            derivative_x = dx -last_dx
-            speed_x = KP*dx + KI*integral_x + KD*derivative_x
-            last_dx = dx
+            timings = self.timings
+            if timings is not None:
+                t = timings.start()
+            dx = X_REF - vector.x1
+            # Time since the previous update, in PID periods
+            periods = 1.0
+            if now is not None:
+                if self.last_time is not None and now > self.last_time:
+                    periods = (now - self.last_time) / PID_PERIOD
+                self.last_time = now
+            self.integral_x += dx * periods
+            self.derivative_x = (dx - self.last_dx) / periods
+            # Steer into curves with the angle of the vector (feedforward)
+            speed_x = (self.kp*dx + self.ki*self.integral_x
+                       + self.kd*self.derivative_x + self.kf*angle)
+            self.last_dx = dx
+            self.speed_x = speed_x
+            if timings is not None:
+                t = timings.add('pid', t)
             ev3.move(speed_x)
+            if timings is not None:
+                timings.add('robot.move', t)
         else:
             # No vector data stop robot
             ev3.stop()
-    # Clear data for reading next loop
-    data.clear()
+            self.last_time = None
+            self.last_angle = None
+
+    def _set_next_turn(self, angle, code):
+        """Set turn at next intersection, as told by barcode code."""
+        if self.navigator is not None:
+            self.navigator.set_next_turn(angle, code)
+        else:
+            self.pixy2.set_next_turn(angle)
+
+
+def main():
+    startup = Startup()
+    startup.phase('imports')
+    ev3 = Robot()
+    startup.phase('robot')
+    # Wait until Pixy2 answers
+    pixy2 = connect_pixy2()
+    startup.phase('pixy2')
+    # Measure time of all stages, print with: kill -USR1 <pid>
+    timings = Timings()
+    timings.dump_on_signal()
+    pixy2.timings = timings
+    # Keep the last frames and motor commands, see recorder.py
+    recorder = FlightRecorder('flight.bin')
+    # Map of the track, made on previous runs and extended on this run
+    if os.path.exists(MAP_FILE):
+        trackmap = TrackMap.load(MAP_FILE)
+    else:
+        trackmap = TrackMap()
+    navigator = Navigator(pixy2, trackmap)
+    # Stream the control loop to a computer, see telemetry.py
+    telemetry = Telemetry()
+    telemetry.start()
+    tracker = LineTracker(ev3, pixy2, timings=timings, recorder=recorder,
+                          navigator=navigator, telemetry=telemetry)
+
+    # Toggle lamp pixy on
+    pixy2.lamp_on()
+
+    # Read data from pixy2 in the background
+    grabber = FrameGrabber(pixy2)
+    grabber.start()
+    startup.phase('start')
+    startup.dump()
+    last_sequence = 0
+    last_errors = 0
+    scheduler = Scheduler(LOOP_FREQUENCY)
+    # Real-time mode with: python3 linetracker.py --realtime
+    realtime = RealTime(enabled='--realtime' in sys.argv)
+    # The loop waits for frames of the grabber, don't let it starve it
+    realtime.enter(threads=[grabber])
+    scheduler.idle = realtime.idle
+
+    # Loop until TouchSensor is pressed
+    while not ev3.touch_4.value():
+        # Wait for next loop, so motors are updated at a steady rate
+        scheduler.wait()
+        # Beep when reading Pixy2 failed since the previous loop
+        if grabber.errors != last_errors:
+            last_errors = grabber.errors
+            ev3.beep()
+        # Get newest linetracking data from pixy2
+        sequence, data = grabber.latest()
+        if sequence == last_sequence:
+            # No new data yet
+            continue
+        last_sequence = sequence
+        # Process data, the PID-controller uses the time between frames
+        tracker.process(data, monotonic())
+
+    realtime.exit()
+
+    # Stop reading data and toggle lamp off
+    grabber.stop()
+    pixy2.lamp_off()
+
+    # Stop robot
+    ev3.stop()
+    ev3.effects.stop()
+    telemetry.stop()
+    recorder.close()
+    trackmap.save(MAP_FILE)
+    print(scheduler.report())
+    print('{} errors reading Pixy2'.format(grabber.errors))
+    print(realtime.report())
+    timings.dump()
 
-# Toggle lamp off
-pixy2.lamp_off()
 
-# Stop robot
-ev3.stop()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+""" Flight recorder: keep the last frames and motor commands in a file.
+
+    The recorder writes fixed-size binary records in a ring file, mapped in
+    memory with mmap. Recording a frame only packs its values in the
+    mapped file, so it can always be on. When the robot leaves the line,
+    the file holds the last capacity frames, read them with:
+
+        python3 recorder.py flight.bin [replay]
+
+    With replay, the frames are processed again by LineTracker, to see
+    what the current code would have commanded.
+"""
+import mmap
+import os
+import struct
+import sys
+from time import time
+
+# Modules shared by the examples, in the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+from common.pixy2 import MainFeatures, MAX_BRANCHES
+
+MAGIC = b'PIXY2FLT'
+_HEADER = struct.Struct('<8sIIQ')     # magic, record size, capacity, count
+# Layout of a record
+_FRAME = struct.Struct('<d4B')        # time, flags, number of features
+_VECTOR = struct.Struct('<6B')        # x0, y0, x1, y1, index, flags
+_INTERSECTION = struct.Struct('<3Bx') # x, y, nr_of_branches
+_BRANCH = struct.Struct('<Bxh')       # index, angle
+_BARCODE = struct.Struct('<4B')       # x, y, flags, code
+_CONTROL = struct.Struct('<4f2h')     # PID terms, speed motor A and B
+MAX_VECTORS = 1
+MAX_BARCODES = 2
+_VECTOR_OFFSET = _FRAME.size
+_INTERSECTION_OFFSET = _VECTOR_OFFSET + MAX_VECTORS * _VECTOR.size
+_BRANCH_OFFSET = _INTERSECTION_OFFSET + _INTERSECTION.size
+_BARCODE_OFFSET = _BRANCH_OFFSET + MAX_BRANCHES * _BRANCH.size
+_CONTROL_OFFSET = _BARCODE_OFFSET + MAX_BARCODES * _BARCODE.size
+RECORD_SIZE = _CONTROL_OFFSET + _CONTROL.size
+_FLAG_ERROR = 1
+_FLAG_NEW = 2
+
+
+class FlightRecorder:
+    """Record frames and motor commands in a ring file of records.
+
+    The file is preallocated for capacity records. When it's full, the
+    oldest records are overwritten. Records are in memory shared with the
+    file, so they are saved even when the script crashes.
+    """
+    def __init__(self, filename, capacity=6000):
+        self.capacity = capacity
+        size = _HEADER.size + capacity * RECORD_SIZE
+        fd = os.open(filename, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.count = 0
+        _HEADER.pack_into(self._map, 0, MAGIC, RECORD_SIZE, capacity, 0)
+
+    def record(self, data, dx=0, integral=0, derivative=0, speed_x=0,
+               speed_a=0, speed_b=0):
+        """Record frame data, the PID terms and the motor speeds."""
+        buffer = self._map
+        offset = _HEADER.size + (self.count % self.capacity) * RECORD_SIZE
+        vectors = min(data.number_of_vectors, MAX_VECTORS)
+        intersections = min(data.number_of_intersections, 1)
+        barcodes = min(data.number_of_barcodes, MAX_BARCODES)
+        flags = (_FLAG_ERROR if data.error else 0) | (
+            _FLAG_NEW if data.new else 0)
+        _FRAME.pack_into(buffer, offset, time(), flags, vectors,
+                         intersections, barcodes)
+        for i in range(0, vectors):
+            v = data.vectors[i]
+            _VECTOR.pack_into(buffer, offset + _VECTOR_OFFSET
+                              + i * _VECTOR.size,
+                              v.x0, v.y0, v.x1, v.y1, v.index, v.flags)
+        if intersections:
+            intersection = data.intersections[0]
+            branches = min(len(intersection.branches), MAX_BRANCHES)
+            _INTERSECTION.pack_into(buffer, offset + _INTERSECTION_OFFSET,
+                                    intersection.x, intersection.y,
+                                    branches)
+            for i in range(0, branches):
+                branch = intersection.branches[i]
+                _BRANCH.pack_into(buffer, offset + _BRANCH_OFFSET
+                                  + i * _BRANCH.size,
+                                  branch.index, branch.angle)
+        for i in range(0, barcodes):
+            b = data.barcodes[i]
+            _BARCODE.pack_into(buffer, offset + _BARCODE_OFFSET
+                               + i * _BARCODE.size,
+                               b.x, b.y, b.flags, b.code)
+        _CONTROL.pack_into(buffer, offset + _CONTROL_OFFSET, dx, integral,
+                           derivative, speed_x, speed_a, speed_b)
+        # Count is written last, so a record is complete when it's counted
+        self.count += 1
+        _HEADER.pack_into(buffer, 0, MAGIC, RECORD_SIZE, self.capacity,
+                          self.count)
+
+    def close(self):
+        """Write the records to disk and close the file."""
+        self._map.flush()
+        self._map.close()
+
+
+class Record:
+    """One frame read from a flight recorder file."""
+    __slots__ = ('time', 'data', 'dx', 'integral', 'derivative', 'speed_x',
+                 'speed_a', 'speed_b')
+
+
+def read_flight(filename):
+    """Return list of Records in a flight recorder file, oldest first."""
+    with open(filename, 'rb') as f:
+        buffer = f.read()
+    magic, record_size, capacity, count = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or record_size != RECORD_SIZE:
+        raise ValueError('{} is not a flight recorder file'.format(filename))
+    records = []
+    for n in range(max(0, count - capacity), count):
+        offset = _HEADER.size + (n % capacity) * RECORD_SIZE
+        record = Record()
+        data = MainFeatures()
+        record.time, flags, vectors, intersections, barcodes = (
+            _FRAME.unpack_from(buffer, offset))
+        data.error = bool(flags & _FLAG_ERROR)
+        data.new = bool(flags & _FLAG_NEW)
+        for i in range(0, vectors):
+            vector = data.new_vector()
+            (vector.x0, vector.y0, vector.x1, vector.y1, vector.index,
+             vector.flags) = _VECTOR.unpack_from(
+                 buffer, offset + _VECTOR_OFFSET + i * _VECTOR.size)
+        if intersections:
+            intersection = data.new_intersection()
+            intersection.x, intersection.y, branches = (
+                _INTERSECTION.unpack_from(buffer,
+                                          offset + _INTERSECTION_OFFSET))
+            intersection.nr_of_branches = branches
+            for i in range(0, branches):
+                branch = intersection.new_branch()
+                branch.index, branch.angle = _BRANCH.unpack_from(
+                    buffer, offset + _BRANCH_OFFSET + i * _BRANCH.size)
+        for i in range(0, barcodes):
+            barcode = data.new_barcode()
+            barcode.x, barcode.y, barcode.flags, barcode.code = (
+                _BARCODE.unpack_from(buffer, offset + _BARCODE_OFFSET
+                                     + i * _BARCODE.size))
+        record.data = data
+        (record.dx, record.integral, record.derivative, record.speed_x,
+         record.speed_a, record.speed_b) = _CONTROL.unpack_from(
+             buffer, offset + _CONTROL_OFFSET)
+        records.append(record)
+    return records
+
+
+def replay(records):
+    """Process records with LineTracker and a simulated robot.
+
+    Returns list of (speed_a, speed_b) the current code commands.
+    """
+    # Only needed for replaying
+    from linetracker import LineTracker
+    from pixy2 import Pixy2
+    from simulator import SimRobot
+    from transport import FakeTransport, make_packet
+
+    result = make_packet(1, struct.pack('<i', 0))
+    robot = SimRobot()
+    tracker = LineTracker(robot, Pixy2(FakeTransport(lambda request: result)))
+    speeds = []
+    for record in records:
+        tracker.process(record.data)
+        speeds.append((robot.motor_a.speed_sp, robot.motor_b.speed_sp))
+    return speeds
+
+
+def main():
+    records = read_flight(sys.argv[1])
+    if len(sys.argv) > 2 and sys.argv[2] == 'replay':
+        speeds = replay(records)
+    else:
+        speeds = None
+    start = records[0].time if records else 0
+    for n, record in enumerate(records):
+        data = record.data
+        line = '{:8.3f}{}'.format(record.time - start,
+                                  ' error' if data.error else '      ')
+        if data.number_of_vectors:
+            v = data.vectors[0]
+            line += ' vector ({:2},{:2})-({:2},{:2}) {}'.format(
+                v.x0, v.y0, v.x1, v.y1, v.flags)
+        else:
+            line += ' no vector' + ' ' * 20
+        line += ' pid {:6.1f} {:6.1f} {:6.1f} motors {:4} {:4}'.format(
+            record.dx, record.integral, record.derivative,
+            record.speed_a, record.speed_b)
+        if speeds is not None:
+            line += ' replay {:4} {:4}'.format(*speeds[n])
+        if data.number_of_intersections:
+            line += ' intersection'
+        for i in range(0, data.number_of_barcodes):
+            line += ' barcode {}'.format(data.barcodes[i].code)
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+""" Replay a Pixy2 capture file to benchmark parsing of linetracking data.
+
+    Record a capture on the robot with:
+
+        pixy2 = Pixy2(RecordingTransport(I2CTransport(), 'capture.bin'))
+
+    Run this script on any computer with Python 3:
+
+        python3 replay.py capture.bin [repeat]
+"""
+import os
+import sys
+from time import perf_counter
+
+# Modules shared by the examples, in the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+from common.pixy2 import Pixy2, MainFeatures
+from common.transport import ReplayTransport, read_capture
+from timing import Timings
+
+
+def main():
+    filename = sys.argv[1]
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    # Only replay the linetracking requests (type 48) of the capture, with
+    # the features of the first one
+    requests = [record[1] for record in read_capture(filename)
+                if record[1][2:3] == bytes((48,))]
+    frames = requests.count(requests[0])
+    pixy2 = Pixy2(ReplayTransport(filename, loop=True))
+    pixy2.set_features(requests[0][5], requests[0][4] == 1)
+    pixy2.timings = Timings()
+    data = MainFeatures()
+    errors = 0
+    start = perf_counter()
+    for i in range(0, frames * repeat):
+        data = pixy2.getdata(data)
+        errors += data.error
+    duration = perf_counter() - start
+    print('{} frames in {:.3f} s: {:.0f} frames/s, {} errors'.format(
+        frames * repeat, duration, frames * repeat / duration, errors))
+    pixy2.timings.dump()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,34 +1,65 @@
 """ All code for the robot."""
-from time import sleep
-from ev3dev2.sensor import INPUT_1, INPUT_4
-from ev3dev2.sensor.lego import TouchSensor
-from ev3dev2.motor import LargeMotor, OUTPUT_A, OUTPUT_B
-from ev3dev2.port import LegoPort
-from ev3dev2.sound import Sound
-from ev3dev2.led import Leds
+from common.motors import MotorCommand
+from effects import Effects
 
 
 SPEED_FAST = 300
 SPEED_SLOW = 100
+MOTOR_DEADBAND = 2   # Speed changes (deg/s) that are not sent to the motors
 
 class Robot:
     def __init__(self):
-        self.sound = Sound()
-        self._leds = Leds()
+        self._connect()
+        # State of robot
+        self._ACTIVE = True
+        self.activate()
+        self._basic_speed = SPEED_FAST
+        self._GAIN = 15
+
+    def _connect(self):
+        """Connect sensors and motors of the EV3."""
+        # Imported here, so Robot can be used with simulated hardware (see
+        # simulator.py) on computers without ev3dev2
+        from ev3dev2.sensor import INPUT_1, INPUT_4
+        from ev3dev2.sensor.lego import TouchSensor
+        from ev3dev2.motor import LargeMotor, OUTPUT_A, OUTPUT_B
+        from ev3dev2.port import LegoPort
+        # Sound and leds are slow to import, they are connected on first use
+        self._sound = None
+        self._leds = None
+        # Beep and set leds in the background, without waiting
+        self.effects = Effects(self)
+        self.effects.start()
         # Connect TouchSensor
         self.touch_4 = TouchSensor(INPUT_4)
         # Connect motors
         self.motor_a = LargeMotor(OUTPUT_A)
         self.motor_b = LargeMotor(OUTPUT_B)
-        # Connect Pixy camera
+        # Only send changed commands to the motors
+        self._command_a = MotorCommand(self.motor_a, MOTOR_DEADBAND,
+                                       stop_action='brake')
+        self._command_b = MotorCommand(self.motor_b, MOTOR_DEADBAND,
+                                       stop_action='brake')
+        # Set port of Pixy camera to i2c, connect Pixy2 with
+        # startup.connect_pixy2() to wait until it's ready
         in1 = LegoPort(INPUT_1)
         in1.mode = 'other-i2c'
-        sleep(0.5)
-        # State of robot
-        self._ACTIVE = True
-        self.activate()
-        self._basic_speed = SPEED_FAST
-        self._GAIN = 15
+
+    @property
+    def sound(self):
+        """Sound of the EV3, connected on first use."""
+        if self._sound is None:
+            from ev3dev2.sound import Sound
+            self._sound = Sound()
+        return self._sound
+
+    @property
+    def leds(self):
+        """Leds of the EV3, connected on first use."""
+        if self._leds is None:
+            from ev3dev2.led import Leds
+            self._leds = Leds()
+        return self._leds
 
     def move(self, speed_x):
         """Move robot when in _ACTIVE mode."""
@@ -36,8 +67,8 @@ class Robot:
             speed_x *= self._GAIN
             speed_a = limit_speed(self._basic_speed - speed_x)
             speed_b = limit_speed(self._basic_speed + speed_x)
-            self.motor_a.run_forever(speed_sp=speed_a)
-            self.motor_b.run_forever(speed_sp=speed_b)
+            self._command_a.run(speed_a)
+            self._command_b.run(speed_b)
     
     def move_slow(self):
         """Set basic speed to slow."""
@@ -47,10 +78,22 @@ class Robot:
         """Set basic speed to fast."""
         self._basic_speed = SPEED_FAST
 
+    def set_speed(self, speed):
+        """Set basic speed (deg/s)."""
+        self._basic_speed = limit_speed(speed)
+
+    def speeds(self):
+        """Return last commanded speeds of motor A and B."""
+        return self._command_a.speed, self._command_b.speed
+
     def stop(self):
         """Stop robot."""
-        self.motor_a.off()
-        self.motor_b.off()
+        self._command_a.stop()
+        self._command_b.stop()
+
+    def beep(self):
+        """Beep, without waiting until the beep is done."""
+        self.effects.beep()
 
     def activate(self):
         """Set robot status to active."""
@@ -61,19 +104,18 @@ class Robot:
         """Set robot status to in-active."""
         self._ACTIVE = False
         self.stop()
-        self._leds.set_color('LEFT', 'RED')
-        self._leds.set_color('RIGHT', 'RED')
+        self.effects.set_color('LEFT', 'RED')
+        self.effects.set_color('RIGHT', 'RED')
 
     def set_leds_right(self):
-        self._leds.set_color('RIGHT', 'ORANGE')
+        self.effects.set_color('RIGHT', 'ORANGE')
 
     def set_leds_left(self):
-        self._leds.set_color('LEFT', 'ORANGE')
+        self.effects.set_color('LEFT', 'ORANGE')
 
     def set_leds_default(self):
-        self._leds.all_off()
-        self._leds.set_color('RIGHT', 'GREEN')
-        self._leds.set_color('LEFT', 'GREEN')
+        self.effects.set_color('RIGHT', 'GREEN')
+        self.effects.set_color('LEFT', 'GREEN')
 
 
 def limit_speed(speed):
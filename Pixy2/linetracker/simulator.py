@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+""" Headless simulation of the linetracking robot.
+
+    The simulated robot drives a differential drive over a track of lines,
+    intersections and barcodes. A simulated Pixy2 camera creates the
+    linetracking responses the way Pixy2 would see the track, and they are
+    parsed by the real Pixy2 class (through a FakeTransport). The robot is
+    controlled by LineTracker from linetracker.py, so control changes can
+    be evaluated without hardware:
+
+        python3 simulator.py [seconds]
+"""
+import os
+import struct
+import sys
+from bisect import bisect_right
+from math import atan2, cos, degrees, hypot, pi, radians, sin
+from time import perf_counter
+
+# Modules shared by the examples, in the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+from common.pixy2 import (
+    Pixy2,
+    MainFeatures,
+    BARCODE_LEFT,
+    FEATURE_VECTOR,
+    FEATURE_INTERSECTION,
+    FEATURE_BARCODE,
+    FEATURES_ALL,
+    )
+from common.motors import MotorCommand
+from common.transport import FakeTransport, make_packet
+from robot import Robot, MOTOR_DEADBAND
+from effects import Effects
+from linetracker import LineTracker
+
+# Robot dimensions in mm
+WHEEL_DIAMETER = 56
+AXLE_TRACK = 120
+
+# Part of the track Pixy2 sees, in mm in front of the wheels
+VIEW_NEAR = 40
+VIEW_FAR = 200
+VIEW_WIDTH = 160
+# Resolution of Pixy2 when linetracking
+FRAME_WIDTH = 79
+FRAME_HEIGHT = 52
+
+FRAME_RATE = 60          # Frames per second of Pixy2
+LOST_TIME = 1.0          # Seconds without line before the robot is lost
+_RESULT_OK = make_packet(1, struct.pack('<i', 0))
+
+
+class Edge:
+    """Line of the track from node start to node end, through points."""
+    def __init__(self, start, end, points):
+        self.start = start
+        self.end = end
+        self.points = points
+        # Distance along the edge at every point
+        self.distances = [0.0]
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            self.distances.append(self.distances[-1] + hypot(x1-x0, y1-y0))
+        self.length = self.distances[-1]
+
+    def point_at(self, s):
+        """Return (x, y) at distance s along the edge."""
+        i = min(max(bisect_right(self.distances, s) - 1, 0),
+                len(self.points) - 2)
+        (x0, y0), (x1, y1) = self.points[i], self.points[i+1]
+        f = (s - self.distances[i]) / (self.distances[i+1] - self.distances[i])
+        return x0 + f*(x1 - x0), y0 + f*(y1 - y0)
+
+    def heading_at(self, s):
+        """Return direction (radians) of the edge at distance s."""
+        i = min(max(bisect_right(self.distances, s) - 1, 0),
+                len(self.points) - 2)
+        (x0, y0), (x1, y1) = self.points[i], self.points[i+1]
+        return atan2(y1 - y0, x1 - x0)
+
+    def project(self, x, y):
+        """Return distance along the edge of the nearest point, and the
+        distance to that point."""
+        best = (0.0, float('inf'))
+        for i in range(0, len(self.points) - 1):
+            (x0, y0), (x1, y1) = self.points[i], self.points[i+1]
+            dx, dy = x1 - x0, y1 - y0
+            length2 = dx*dx + dy*dy
+            f = max(0.0, min(1.0, ((x - x0)*dx + (y - y0)*dy) / length2))
+            d = hypot(x0 + f*dx - x, y0 + f*dy - y)
+            if d < best[1]:
+                best = (self.distances[i] + f*(self.distances[i+1]
+                                                - self.distances[i]), d)
+        return best
+
+
+class Track:
+    """Track of lines (directed edges between nodes) and barcodes.
+
+    A node with more than one edge leaving it is an intersection.
+    """
+    def __init__(self):
+        self.nodes = {}
+        self.edges = {}
+        self.barcodes = []
+
+    def add_node(self, name, x, y):
+        self.nodes[name] = (x, y)
+        self.edges[name] = []
+
+    def add_edge(self, start, end, via=()):
+        """Add line from node start to node end through points via."""
+        points = [self.nodes[start]] + list(via) + [self.nodes[end]]
+        edge = Edge(start, end, points)
+        self.edges[start].append(edge)
+        return edge
+
+    def add_barcode(self, x, y, code):
+        self.barcodes.append((x, y, code))
+
+    def is_intersection(self, node):
+        return len(self.edges[node]) > 1
+
+
+def arc(cx, cy, r, start, end, steps=9):
+    """Return points of an arc around (cx, cy), angles in degrees."""
+    return [(cx + r*cos(radians(start + (end - start)*i/steps)),
+             cy + r*sin(radians(start + (end - start)*i/steps)))
+            for i in range(1, steps)]
+
+
+def default_track():
+    """Oval of 1600x1000 mm with a shortcut through the middle.
+
+    The robot drives counter clockwise. The shortcut starts at an
+    intersection in the bottom line and a barcode tells the robot to take
+    it (turn left).
+    """
+    track = Track()
+    track.add_node('start', 300, 0)
+    track.add_node('m1', 800, 0)
+    track.add_node('m2', 800, 1000)
+    track.add_edge('start', 'm1')
+    track.add_edge('m1', 'm2',
+                   [(1300, 0)] + arc(1300, 300, 300, -90, 0)
+                   + [(1600, 300), (1600, 700)] + arc(1300, 700, 300, 0, 90)
+                   + [(1300, 1000)])
+    track.add_edge('m1', 'm2')
+    track.add_edge('m2', 'start',
+                   [(300, 1000)] + arc(300, 700, 300, 90, 180)
+                   + [(0, 700), (0, 300)] + arc(300, 300, 300, 180, 270))
+    track.add_barcode(600, 40, BARCODE_LEFT)
+    return track
+
+
+class SimMotor:
+    """Simulated LargeMotor, only remembers its speed."""
+    def __init__(self):
+        self.speed_sp = 0
+        self.stop_action = 'coast'
+
+    def run_forever(self, speed_sp):
+        self.speed_sp = speed_sp
+
+    def stop(self):
+        self.speed_sp = 0
+
+
+class _SimLeds:
+    def set_color(self, group, color):
+        pass
+
+    def all_off(self):
+        pass
+
+
+class _SimSound:
+    def beep(self):
+        pass
+
+
+class _SimTouchSensor:
+    def value(self):
+        return 0
+
+
+class SimRobot(Robot):
+    """Robot with simulated hardware."""
+    def _connect(self):
+        self._sound = _SimSound()
+        self._leds = _SimLeds()
+        self.effects = Effects(self, background=False)
+        self.touch_4 = _SimTouchSensor()
+        self.motor_a = SimMotor()
+        self.motor_b = SimMotor()
+        self._command_a = MotorCommand(self.motor_a, MOTOR_DEADBAND)
+        self._command_b = MotorCommand(self.motor_b, MOTOR_DEADBAND)
+
+
+class Simulation:
+    """Drive a SimRobot with LineTracker over a track.
+
+    motor_a drives the left wheel and motor_b the right wheel. Every step
+    is one frame of Pixy2: the camera sees the track, LineTracker processes
+    the frame and the robot drives for one frame time.
+    """
+    def __init__(self, track=None, kp=None, ki=None, kd=None, kf=None,
+                 gain=None):
+        self.track = track or default_track()
+        self.robot = SimRobot()
+        if gain is not None:
+            self.robot._GAIN = gain
+        self.pixy2 = Pixy2(FakeTransport(self._respond))
+        gains = {}
+        for name, value in (('kp', kp), ('ki', ki), ('kd', kd), ('kf', kf)):
+            if value is not None:
+                gains[name] = value
+        self.tracker = LineTracker(self.robot, self.pixy2, **gains)
+        self.data = MainFeatures()
+        # Pose of the robot (mm and radians), on the first edge
+        self.edge = self.track.edges['start'][0]
+        self.next_edge = None
+        self.s = 0.0
+        self.x, self.y = self.edge.point_at(0.0)
+        self.heading = self.edge.heading_at(0.0)
+        # Settings of Pixy2
+        self.next_turn = None
+        self.default_turn = 0
+        # Results
+        self.time = 0.0
+        self.laps = []
+        self._lap_start = 0.0
+        self.distance = 0.0
+        self.error_sum = 0.0
+        self.error_max = 0.0
+        self.steps = 0
+        self.lost = False
+        self._lost_time = 0.0
+
+    # Simulated Pixy2
+
+    def _respond(self, request):
+        """Create the response of Pixy2 to request."""
+        request_type = request[2]
+        if request_type == 48:
+            return make_packet(49, self._features(request[5]))
+        if request_type == 58:
+            self.next_turn = struct.unpack_from('<h', request, 4)[0]
+        elif request_type == 60:
+            self.default_turn = struct.unpack_from('<h', request, 4)[0]
+        return _RESULT_OK
+
+    def _to_frame(self, x, y):
+        """Return frame coordinates of a point of the track."""
+        dx, dy = x - self.x, y - self.y
+        c, s = cos(self.heading), sin(self.heading)
+        forward = dx*c + dy*s
+        left = -dx*s + dy*c
+        fx = (FRAME_WIDTH - 1) / 2 * (1 - left / (VIEW_WIDTH / 2))
+        fy = (FRAME_HEIGHT - 1) * (VIEW_FAR - forward) / (VIEW_FAR - VIEW_NEAR)
+        return fx, fy
+
+    @staticmethod
+    def _in_frame(fx, fy):
+        return (-0.5 < fx < FRAME_WIDTH - 0.5
+                and -0.5 < fy < FRAME_HEIGHT - 0.5)
+
+    def _choose_edge(self):
+        """Choose the edge to take at the end of the current edge."""
+        edges = self.track.edges[self.edge.end]
+        if len(edges) == 1:
+            return edges[0]
+        # Intersection: next turn is only used once
+        turn = self.default_turn if self.next_turn is None else self.next_turn
+        self.next_turn = None
+        arrival = self.edge.heading_at(self.edge.length)
+
+        def angle(edge):
+            a = degrees(edge.heading_at(0.0) - arrival)
+            return (a + 180) % 360 - 180
+        return min(edges, key=lambda edge: abs(angle(edge) - turn))
+
+    def _route_point(self, s):
+        """Return point at distance s along current and next edge."""
+        if s <= self.edge.length or self.next_edge is None:
+            return self.edge.point_at(min(s, self.edge.length))
+        return self.next_edge.point_at(s - self.edge.length)
+
+    def _features(self, features=FEATURES_ALL):
+        """Return linetracking payload of what Pixy2 sees now, only with
+        the requested features (bitmap)."""
+        payload = bytearray()
+        end = self.edge.end
+        fx, fy = self._to_frame(*self.track.nodes[end])
+        intersection = (self.track.is_intersection(end)
+                        and self._in_frame(fx, fy))
+        if self.next_edge is None and (
+                (intersection and fy > FRAME_HEIGHT / 2)
+                or not self.track.is_intersection(end)):
+            # Pixy2 chooses the branch when the intersection is in the
+            # lower half of the view, and reports the intersection
+            if intersection and features & FEATURE_INTERSECTION:
+                payload += self._intersection(end, fx, fy)
+            self.next_edge = self._choose_edge()
+        # Vector: from the bottom of the view along the line
+        c, s = cos(self.heading), sin(self.heading)
+        x, y = self.x + VIEW_NEAR*c, self.y + VIEW_NEAR*s
+        s0, distance = self.edge.project(x, y)
+        if self.next_edge is not None:
+            s_next, distance_next = self.next_edge.project(x, y)
+            if distance_next < distance:
+                s0 = self.edge.length + s_next
+        end_of_route = self.edge.length
+        if self.next_edge is not None:
+            end_of_route += self.next_edge.length
+        # Walk along the line to the first point in view
+        position = max(s0 - VIEW_NEAR, 0.0)
+        tail = None
+        while position < min(s0 + VIEW_FAR, end_of_route):
+            point = self._to_frame(*self._route_point(position))
+            if self._in_frame(*point):
+                tail = point
+                break
+            position += 2.0
+        if tail is not None and features & FEATURE_VECTOR:
+            # Walk further to the last point in view
+            head = tail
+            while position < end_of_route:
+                position = min(position + 5.0, end_of_route)
+                point = self._to_frame(*self._route_point(position))
+                if not self._in_frame(*point):
+                    break
+                head = point
+            payload += bytes((1, 6, round(tail[0]), round(tail[1]),
+                              round(head[0]), round(head[1]), 1,
+                              4 if intersection else 0))
+        # Barcodes
+        for x, y, code in self.track.barcodes:
+            fx, fy = self._to_frame(x, y)
+            if self._in_frame(fx, fy) and features & FEATURE_BARCODE:
+                payload += bytes((4, 4, round(fx), round(fy), 0, code))
+        return payload
+
+    def _intersection(self, node, fx, fy):
+        """Return intersection feature of node."""
+        arrival = self.edge.heading_at(self.edge.length)
+        angles = [180]
+        for edge in self.track.edges[node]:
+            a = degrees(edge.heading_at(0.0) - arrival)
+            angles.append(round((a + 180) % 360 - 180))
+        angles = angles[:6]
+        data = bytearray((2, 28, round(fx), round(fy), len(angles), 0))
+        for i, angle in enumerate(angles):
+            data += struct.pack('<Bxh', i, angle)
+        data += bytes(28 - 4 - 4*len(angles))
+        return data
+
+    # Simulated robot
+
+    def _drive(self, dt):
+        """Move robot dt seconds with the current motor speeds."""
+        mm_per_degree = pi * WHEEL_DIAMETER / 360
+        left = self.robot.motor_a.speed_sp * mm_per_degree
+        right = self.robot.motor_b.speed_sp * mm_per_degree
+        v = (left + right) / 2
+        w = (right - left) / AXLE_TRACK
+        heading = self.heading + w * dt / 2
+        self.x += v * dt * cos(heading)
+        self.y += v * dt * sin(heading)
+        self.heading += w * dt
+        self.distance += abs(v) * dt
+
+    def _follow_track(self):
+        """Update position of the robot along the track."""
+        s, error = self.edge.project(self.x, self.y)
+        if self.next_edge is None and s >= self.edge.length:
+            self.next_edge = self._choose_edge()
+        if self.next_edge is not None:
+            s_next, error_next = self.next_edge.project(self.x, self.y)
+            if s_next > 0 and error_next <= error:
+                # Robot drives on the next edge now
+                self.edge = self.next_edge
+                self.next_edge = None
+                s, error = s_next, error_next
+                if self.edge.start == 'start':
+                    self.laps.append(self.time - self._lap_start)
+                    self._lap_start = self.time
+        self.s = s
+        self.error_sum += error
+        self.error_max = max(self.error_max, error)
+
+    def step(self, dt=1.0 / FRAME_RATE):
+        """Simulate one frame of dt seconds."""
+        self.data = self.pixy2.getdata(self.data)
+        self.tracker.process(self.data)
+        self._drive(dt)
+        self._follow_track()
+        self.time += dt
+        self.steps += 1
+        if self.data.number_of_vectors == 0:
+            self._lost_time += dt
+            self.lost = self._lost_time >= LOST_TIME
+        else:
+            self._lost_time = 0.0
+
+    def run(self, duration, dt=1.0 / FRAME_RATE):
+        """Simulate duration seconds, or until the robot lost the line."""
+        while self.time < duration and not self.lost:
+            self.step(dt)
+        return self.results()
+
+    def results(self):
+        """Return results of the simulation as dictionary."""
+        return {
+            'time': self.time,
+            'laps': list(self.laps),
+            'best_lap': min(self.laps) if self.laps else None,
+            'distance': self.distance,
+            'mean_error': self.error_sum / max(self.steps, 1),
+            'max_error': self.error_max,
+            'lost': self.lost,
+            }
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 120.0
+    simulation = Simulation()
+    start = perf_counter()
+    results = simulation.run(duration)
+    elapsed = perf_counter() - start
+    print('{} steps in {:.2f} s: {:.0f} steps/s'.format(
+        simulation.steps, elapsed, simulation.steps / elapsed))
+    print('Laps: {}'.format(', '.join('{:.2f} s'.format(lap)
+                                      for lap in results['laps'])))
+    print('Mean error {:.1f} mm, max error {:.1f} mm{}'.format(
+        results['mean_error'], results['max_error'],
+        ', robot lost the line' if results['lost'] else ''))
+
+
+if __name__ == '__main__':
+    main()
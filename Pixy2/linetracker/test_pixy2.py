@@ -0,0 +1,99 @@
+""" Tests of the Pixy2 protocol with FakeTransport, run with:
+    python3 -m unittest"""
+import os
+import sys
+import unittest
+from time import sleep
+
+# Modules shared by the examples, in the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+from common.pixy2 import Pixy2, RETRIES
+from common.transport import FakeTransport, make_packet
+from acquisition import FrameGrabber
+
+# Main features with one vector
+VECTOR = bytes((1, 6, 10, 50, 40, 5, 0, 0))
+RESPONSE = make_packet(49, VECTOR)
+
+
+class Responses:
+    """Respond with the given responses in turn, then with RESPONSE.
+
+    A response can be an exception to raise instead.
+    """
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = 0
+
+    def __call__(self, request):
+        self.requests += 1
+        response = self.responses.pop(0) if self.responses else RESPONSE
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class ReceiveTest(unittest.TestCase):
+    def getdata(self, *responses):
+        self.responses = Responses(*responses)
+        self.pixy2 = Pixy2(FakeTransport(self.responses))
+        return self.pixy2.getdata()
+
+    def assert_vector(self, data):
+        self.assertFalse(data.error)
+        self.assertEqual(data.number_of_vectors, 1)
+        vector = data.vectors[0]
+        self.assertEqual((vector.x0, vector.y0, vector.x1, vector.y1),
+                         (10, 50, 40, 5))
+
+    def test_response(self):
+        self.assert_vector(self.getdata())
+        self.assertEqual(self.responses.requests, 1)
+
+    def test_checksum_error_retried(self):
+        corrupted = bytearray(RESPONSE)
+        corrupted[-1] ^= 0xff
+        self.assert_vector(self.getdata(bytes(corrupted)))
+        self.assertEqual(self.pixy2.checksum_errors, 1)
+        self.assertEqual(self.responses.requests, 2)
+
+    def test_resync(self):
+        self.assert_vector(self.getdata(bytes(3) + RESPONSE))
+        self.assertEqual(self.pixy2.resyncs, 1)
+        self.assertEqual(self.responses.requests, 1)
+
+    def test_no_sync_retried(self):
+        self.assert_vector(self.getdata(bytes(100)))
+        self.assertEqual(self.pixy2.sync_errors, 1)
+        self.assertEqual(self.responses.requests, 2)
+
+    def test_transport_error_retried(self):
+        self.assert_vector(self.getdata(OSError(121, 'Remote I/O error')))
+        self.assertEqual(self.pixy2.io_errors, 1)
+        self.assertEqual(self.responses.requests, 2)
+
+    def test_all_retries_fail(self):
+        errors = [OSError(121, 'Remote I/O error')] * (RETRIES + 1)
+        data = self.getdata(*errors)
+        self.assertTrue(data.error)
+        self.assertEqual(self.pixy2.io_errors, RETRIES + 1)
+
+
+class FrameGrabberTest(unittest.TestCase):
+    def test_backoff_on_errors(self):
+        def respond(request):
+            raise OSError(121, 'Remote I/O error')
+        pixy2 = Pixy2(FakeTransport(respond))
+        grabber = FrameGrabber(pixy2, interval=0.01)
+        grabber.start()
+        sleep(0.2)
+        grabber.stop()
+        # About one frame per interval, not a busy loop
+        self.assertGreater(grabber.errors, 0)
+        self.assertLess(grabber.errors, 40)
+        self.assertEqual(grabber.latest()[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+""" Tests of the map of intersections, run with: python3 -m unittest"""
+import os
+import tempfile
+import unittest
+
+from trackmap import TrackMap, Navigator
+
+
+class FakePixy2:
+    """Keeps the turns the navigator sets."""
+    def __init__(self):
+        self.default_turn = None
+        self.next_turns = []
+
+    def set_default_turn(self, angle):
+        self.default_turn = angle
+
+    def set_next_turn(self, angle):
+        self.next_turns.append(angle)
+
+
+class Branch:
+    def __init__(self, angle):
+        self.angle = angle
+
+
+class Intersection:
+    def __init__(self, *angles):
+        self.branches = [Branch(angle) for angle in angles]
+
+
+class Clock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+# Two T-junctions that look the same
+JUNCTION = Intersection(0, 90, 180)
+
+
+class NavigatorTest(unittest.TestCase):
+    def setUp(self):
+        self.pixy2 = FakePixy2()
+        self.clock = Clock()
+
+    def drive(self, navigator, times):
+        """Arrive at a junction after each of times seconds."""
+        for time in times:
+            self.clock.time += time
+            navigator.intersection(JUNCTION)
+
+    def test_look_alikes_are_not_one_node(self):
+        navigator = Navigator(self.pixy2, clock=self.clock)
+        self.drive(navigator, [3.0, 3.0, 3.0, 3.0, 3.0])
+        self.assertFalse(navigator.located)
+        self.assertFalse(navigator.routing)
+        self.assertEqual(navigator.map.confirmed, set())
+        # Barcodes still set the turn
+        navigator.set_next_turn(90, 1)
+        self.assertEqual(self.pixy2.next_turns, [90])
+
+    def test_look_alikes_merged_after_distinct_edges(self):
+        navigator = Navigator(self.pixy2, clock=self.clock)
+        # Start before the first junction, then drive the loop three times
+        self.drive(navigator, [1.0, 3.0, 5.0, 3.0, 5.0, 3.0])
+        self.assertFalse(navigator.located)
+        self.drive(navigator, [5.0])
+        self.assertTrue(navigator.located)
+        trackmap = navigator.map
+        self.assertEqual(len(trackmap.nodes), 2)
+        self.assertEqual(trackmap.confirmed, set(trackmap.nodes))
+        first, second = sorted(trackmap.nodes)
+        self.assertEqual(trackmap.edges[first][0]['to'], second)
+        self.assertEqual(trackmap.edges[second][0]['to'], first)
+        self.assertTrue(navigator.routing)
+
+    def test_loop_with_repeated_edges_not_aliased(self):
+        # Four junctions: shifted by two, most of the edges match
+        navigator = Navigator(self.pixy2, clock=self.clock)
+        self.drive(navigator, [4.0, 4.0, 4.0, 3.0] * 3)
+        self.assertFalse(navigator.located)
+        self.drive(navigator, [4.0, 4.0, 4.0, 3.0] * 3)
+        self.assertTrue(navigator.located)
+        trackmap = navigator.map
+        self.assertEqual(len(trackmap.confirmed), 4)
+        times = []
+        node = navigator.node
+        for i in range(4):
+            edge = trackmap.edges[node][0]
+            times.append(edge['time'])
+            node = edge['to']
+        self.assertEqual(node, navigator.node)
+        self.assertEqual(sorted(times), [3.0, 4.0, 4.0, 4.0])
+
+    def test_located_on_saved_map(self):
+        trackmap = TrackMap()
+        first = trackmap.add_node([0, 90, 180])
+        second = trackmap.add_node([0, 90, 180])
+        trackmap.add_edge(first, 0, second, 3.0)
+        trackmap.add_edge(second, 0, first, 5.0)
+        navigator = Navigator(self.pixy2, trackmap, clock=self.clock)
+        # Start at second, not known which junction it is
+        self.drive(navigator, [1.0, 5.0])
+        self.assertFalse(navigator.located)
+        self.drive(navigator, [3.0])
+        self.assertTrue(navigator.located)
+        self.assertEqual(navigator.node, second)
+        self.assertEqual(sorted(trackmap.nodes), [first, second])
+
+    def test_wrong_saved_map_mapped_again(self):
+        trackmap = TrackMap()
+        first = trackmap.add_node([0, 90, 180])
+        second = trackmap.add_node([0, 90, 180])
+        trackmap.add_edge(first, 0, second, 3.0)
+        trackmap.add_edge(second, 0, first, 5.0)
+        navigator = Navigator(self.pixy2, trackmap, clock=self.clock)
+        self.drive(navigator, [1.0, 5.0, 3.0])
+        self.assertEqual(navigator.node, second)
+        # The edge from second takes much longer than on the map
+        self.drive(navigator, [8.0])
+        self.assertFalse(navigator.located)
+        self.drive(navigator, [3.0, 8.0] * 3)
+        self.assertTrue(navigator.located)
+        self.assertEqual(len(trackmap.nodes), 2)
+        self.assertIn(second, trackmap.nodes)
+        edge = trackmap.edges[second][0]
+        self.assertEqual(edge['time'], 8.0)
+        self.assertEqual(trackmap.edges[edge['to']][0],
+                         {'to': second, 'time': 3.0, 'barcodes': []})
+
+    def test_unconfirmed_nodes_not_saved(self):
+        navigator = Navigator(self.pixy2, clock=self.clock)
+        self.drive(navigator, [3.0, 3.0, 3.0])
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            navigator.map.save(filename)
+            trackmap = TrackMap.load(filename)
+        finally:
+            os.remove(filename)
+        self.assertEqual(trackmap.nodes, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+""" Lightweight timing of the stages of a control loop."""
+import signal
+import sys
+from array import array
+from time import perf_counter
+
+
+class Stage:
+    """Durations of one stage: counters and a ring of recent samples."""
+    __slots__ = ('count', 'total', 'max', '_samples', '_index')
+
+    def __init__(self, size):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = array('d', bytes(8 * size))
+        self._index = 0
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        self._samples[self._index] = duration
+        self._index = (self._index + 1) % len(self._samples)
+
+    def percentiles(self, *percents):
+        """Return percentiles of the recent samples."""
+        samples = sorted(self._samples[:min(self.count, len(self._samples))])
+        if not samples:
+            return [0.0 for p in percents]
+        return [samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+                for p in percents]
+
+
+class Timings:
+    """Measure how long the stages of a loop take.
+
+    Usage:
+
+        t = timings.start()
+        ...                             # First stage
+        t = timings.add('first', t)
+        ...                             # Second stage
+        t = timings.add('second', t)
+
+    Each stage keeps its count, total and maximum duration, and the last
+    size durations for the percentiles in report(). Adding a duration
+    doesn't allocate memory, and stages can be added from more than one
+    thread (a sample can get lost then, but nothing breaks).
+    """
+    def __init__(self, size=1024):
+        self.size = size
+        self._stages = {}
+
+    start = staticmethod(perf_counter)
+
+    def add(self, name, start):
+        """Add time since start to stage name and return current time."""
+        now = perf_counter()
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = Stage(self.size)
+        stage.add(now - start)
+        return now
+
+    def report(self):
+        """Return table with statistics of all stages (in ms) as text."""
+        lines = ['{:<20}{:>8}{:>9}{:>9}{:>9}{:>9}{:>9}'.format(
+            'stage', 'count', 'mean', 'p50', 'p95', 'p99', 'max')]
+        for name in sorted(self._stages):
+            stage = self._stages[name]
+            p50, p95, p99 = stage.percentiles(50, 95, 99)
+            lines.append(
+                '{:<20}{:>8}{:>9.3f}{:>9.3f}{:>9.3f}{:>9.3f}{:>9.3f}'.format(
+                    name, stage.count, stage.total / stage.count * 1000,
+                    p50 * 1000, p95 * 1000, p99 * 1000, stage.max * 1000))
+        return '\n'.join(lines)
+
+    def dump(self, file=sys.stdout):
+        """Print report to file."""
+        print(self.report(), file=file)
+
+    def dump_on_signal(self, signum=signal.SIGUSR1):
+        """Print report when the process receives signal signum.
+
+        For example with: kill -USR1 <pid of script>
+        """
+        signal.signal(signum, lambda signum, frame: self.dump())
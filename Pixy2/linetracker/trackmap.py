@@ -0,0 +1,376 @@
+""" Map of the intersections of a track, and routes over it."""
+import heapq
+import json
+from time import monotonic
+
+ANGLE_STEP = 15       # Branch angles are rounded to multiples of this
+MIN_EDGE_TIME = 0.5   # Intersections within this time are the same one
+DEFAULT_TURN = 0      # Turn at intersections without next turn
+MATCH_EDGES = 2       # Edges that must match before nodes are merged
+TIME_TOLERANCE = 0.1  # Relative difference of driving times that match
+LOST_TOLERANCE = 0.3  # Relative difference from the time of a known edge
+                      # that means the map is wrong
+MAX_CHAIN = 40        # Unconfirmed nodes kept, so matching stays fast
+
+
+def round_angle(angle):
+    """Round branch angle to a multiple of ANGLE_STEP."""
+    return int(round(angle / ANGLE_STEP) * ANGLE_STEP)
+
+
+class TrackMap:
+    """Graph of the intersections (nodes) of a track.
+
+    A node has the angles of its branches, but different intersections
+    can have the same branches. An edge is the line from a node, leaving
+    it with a turn (angle of the branch), to the next node. Edges keep the
+    time it takes to drive them and the barcodes on the way.
+
+    Nodes are confirmed when it's certain which intersection they are.
+    Only confirmed nodes are found, routed over and saved.
+    """
+    def __init__(self):
+        self.nodes = {}
+        self.edges = {}
+        self.confirmed = set()
+
+    def add_node(self, branches, confirmed=True):
+        """Add node with branch angles, return its id."""
+        node = max(self.nodes, default=0) + 1
+        self.nodes[node] = sorted(branches)
+        self.edges[node] = {}
+        if confirmed:
+            self.confirmed.add(node)
+        return node
+
+    def add_edge(self, start, turn, end, time, barcodes=()):
+        """Add or update edge from start with turn to end."""
+        edge = self.edges[start].get(turn)
+        if edge is None or edge['to'] != end:
+            self.edges[start][turn] = {'to': end, 'time': time,
+                                       'barcodes': list(barcodes)}
+        else:
+            # Average of the driving times
+            edge['time'] = (edge['time'] + time) / 2
+
+    def merge(self, node, into):
+        """Merge node into node into: it's the same intersection."""
+        for turn, edge in self.edges.pop(node).items():
+            end = into if edge['to'] == node else edge['to']
+            self.add_edge(into, turn, end, edge['time'], edge['barcodes'])
+        for edges in self.edges.values():
+            for edge in edges.values():
+                if edge['to'] == node:
+                    edge['to'] = into
+        del self.nodes[node]
+        self.confirmed.discard(node)
+
+    def remove(self, node):
+        """Remove node and the edges to it."""
+        del self.nodes[node]
+        del self.edges[node]
+        self.confirmed.discard(node)
+        for edges in self.edges.values():
+            for turn in [turn for turn, edge in edges.items()
+                         if edge['to'] == node]:
+                del edges[turn]
+
+    def find(self, branches):
+        """Return id of the only confirmed node with these branches, or
+        None."""
+        branches = sorted(branches)
+        found = [node for node in self.confirmed
+                 if self.nodes[node] == branches]
+        return found[0] if len(found) == 1 else None
+
+    def route(self, start, goal=None):
+        """Return list of turns of the fastest route from start to goal.
+
+        Without goal, the route is the fastest lap: back to start. Returns
+        None when there is no known route.
+        """
+        if goal is None:
+            goal = start
+        # Dijkstra, the start node is only done after leaving it
+        queue = [(0.0, start, [])]
+        done = set()
+        while queue:
+            time, node, turns = heapq.heappop(queue)
+            if node == goal and turns:
+                return turns
+            if node in done:
+                continue
+            if turns or node != goal:
+                done.add(node)
+            for turn, edge in sorted(self.edges[node].items()):
+                if edge['to'] not in done and edge['to'] in self.confirmed:
+                    heapq.heappush(queue, (time + edge['time'], edge['to'],
+                                           turns + [turn]))
+        return None
+
+    def save(self, filename):
+        """Save confirmed nodes and the edges between them as JSON."""
+        data = {
+            'nodes': {str(node): self.nodes[node]
+                      for node in self.confirmed},
+            'edges': {str(node): {str(turn): edge
+                                  for turn, edge in self.edges[node].items()
+                                  if edge['to'] in self.confirmed}
+                      for node in self.confirmed},
+            }
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+
+    @classmethod
+    def load(cls, filename):
+        """Return map saved with save()."""
+        with open(filename) as f:
+            data = json.load(f)
+        trackmap = cls()
+        for node, branches in data['nodes'].items():
+            trackmap.nodes[int(node)] = branches
+            trackmap.edges[int(node)] = {}
+            trackmap.confirmed.add(int(node))
+        for node, edges in data['edges'].items():
+            for turn, edge in edges.items():
+                trackmap.edges[int(node)][int(turn)] = edge
+        return trackmap
+
+
+class Navigator:
+    """Build the map while driving, and follow the fastest route.
+
+    Call intersection() for every intersection Pixy2 reports, and
+    set_next_turn() for barcodes telling which way to go.
+
+    The navigator knows where the robot is when it starts at a node with
+    unique branches, or drives a known edge from a known node. Otherwise
+    every intersection is added as a new, unconfirmed node. These nodes
+    are merged with confirmed nodes when the last MATCH_EDGES (or more)
+    edges match only one path on the map: same branches, turns, barcodes
+    and about the same driving times. On a new map they are merged with
+    each other when the robot drove the same loop three times. When the
+    driving time of a known edge is far off, the edge is mapped again, so
+    a wrong map corrects itself.
+
+    While it knows where the robot is, the navigator sets the turn for the
+    next node of the fastest route to goal (or the fastest lap without
+    goal) right away, so the robot doesn't need barcodes or slow down at
+    intersections. The default turn is set on Pixy2, so only other turns
+    have to be requested.
+    """
+    def __init__(self, pixy2, trackmap=None, goal=None, clock=monotonic):
+        self.pixy2 = pixy2
+        self.map = trackmap or TrackMap()
+        self.goal = goal
+        self.clock = clock
+        # Node the robot left, with turn and time, and barcodes since then
+        self.node = None
+        self.turn = None
+        self.time = None
+        self.barcodes = []
+        # True when self.node is a confirmed node
+        self.located = False
+        # Unconfirmed nodes since the robot was located, and the confirmed
+        # node it left before them (None when unknown)
+        self.chain = []
+        self.origin = None
+        # Turn Pixy2 takes at the next intersection
+        self.next_turn = DEFAULT_TURN
+        # True when the turn at the next node comes from the route
+        self.routing = False
+        self.pixy2.set_default_turn(DEFAULT_TURN)
+
+    def set_next_turn(self, angle, code=None):
+        """Turn angle at the next intersection, as told by barcode code.
+
+        Ignored when following a route.
+        """
+        if code is not None and self.barcodes[-1:] != [code]:
+            self.barcodes.append(code)
+        if not self.routing:
+            self._set_next_turn(angle)
+
+    def _set_next_turn(self, angle):
+        if angle != self.next_turn:
+            self.pixy2.set_next_turn(angle)
+            self.next_turn = angle
+
+    def intersection(self, intersection):
+        """Robot arrives at an intersection, reported by Pixy2."""
+        now = self.clock()
+        if self.time is not None and now - self.time < MIN_EDGE_TIME:
+            # Same intersection again
+            return
+        branches = sorted(round_angle(branch.angle)
+                          for branch in intersection.branches)
+        node = self._locate(branches, now)
+        # Pixy2 takes the branch closest to the next turn
+        turns = [angle for angle in branches if abs(angle) != 180]
+        turn = min(turns, key=lambda angle: abs(angle - self.next_turn),
+                   default=DEFAULT_TURN)
+        self.node = node
+        self.turn = turn
+        self.time = now
+        self.barcodes = []
+        # Pixy2 returns to the default turn after an intersection
+        self.next_turn = DEFAULT_TURN
+        # Set turn at the next node, when the route is known
+        self.routing = False
+        if not self.located:
+            return
+        edge = self.map.edges[node].get(turn)
+        if edge is not None and edge['to'] in self.map.confirmed:
+            route = self.map.route(edge['to'], self.goal)
+            if route:
+                self._set_next_turn(route[0])
+                self.routing = True
+
+    def _locate(self, branches, now):
+        """Return node of the intersection the robot arrived at."""
+        if self.node is None:
+            # Only unique branches tell where the robot starts
+            node = self.map.find(branches)
+            if node is not None:
+                self.located = True
+                return node
+            return self._add_node(branches)
+        edge = self.map.edges[self.node].get(self.turn)
+        if (self.located and edge is not None
+                and edge['to'] in self.map.confirmed):
+            if self.map.nodes[edge['to']] != branches:
+                # Not the intersection the map expects, robot is lost
+                self.located = False
+                self.origin = None
+                return self._add_node(branches)
+            time = now - self.time
+            if abs(time - edge['time']) <= LOST_TOLERANCE * edge['time']:
+                self.map.add_edge(self.node, self.turn, edge['to'], time,
+                                  self.barcodes)
+                return edge['to']
+            # Driving time doesn't fit, the edge on the map is wrong: map
+            # it again
+            del self.map.edges[self.node][self.turn]
+        if self.located:
+            # New edge from a known node
+            self.located = False
+            self.origin = self.node
+        node = self._add_node(branches)
+        self.map.add_edge(self.node, self.turn, node, now - self.time,
+                          self.barcodes)
+        return self._match()
+
+    def _add_node(self, branches):
+        """Add unconfirmed node for the intersection."""
+        if len(self.chain) >= MAX_CHAIN:
+            # Forget the oldest, and where it came from
+            self.map.remove(self.chain.pop(0))
+            self.origin = None
+        node = self.map.add_node(branches, confirmed=False)
+        self.chain.append(node)
+        return node
+
+    def _step(self, node, turn):
+        """Return branches, turn, time, barcodes and branches at the end of
+        the edge from node with turn, None when there's no edge."""
+        edge = self.map.edges[node].get(turn)
+        if edge is None:
+            return None
+        return (self.map.nodes[node], turn, edge['time'], edge['barcodes'],
+                self.map.nodes[edge['to']])
+
+    def _entry(self):
+        """Return step from the origin to the first node of the chain."""
+        for turn, edge in self.map.edges[self.origin].items():
+            if edge['to'] == self.chain[0]:
+                return self._step(self.origin, turn)
+        return None
+
+    @staticmethod
+    def _same(step, other):
+        """True when two steps can be the same edge."""
+        if step is None or other is None:
+            return False
+        return (step[0] == other[0] and step[1] == other[1]
+                and step[3] == other[3] and step[4] == other[4]
+                and abs(step[2] - other[2])
+                <= TIME_TOLERANCE * max(step[2], other[2]))
+
+    def _match(self):
+        """Merge unconfirmed nodes when the edges between them match, return
+        node the robot arrived at."""
+        chain = self.chain
+        steps = [self._step(node, next(iter(self.map.edges[node])))
+                 for node in chain[:-1]]
+        # Path on the map with the same edges
+        for start in range(0, len(steps) - MATCH_EDGES + 1):
+            paths = []
+            for node in sorted(self.map.confirmed):
+                path = [node]
+                for step in steps[start:]:
+                    if not self._same(self._step(path[-1], step[1]), step):
+                        break
+                    end = self.map.edges[path[-1]][step[1]]['to']
+                    if end not in self.map.confirmed:
+                        break
+                    path.append(end)
+                else:
+                    paths.append(path)
+            if len(paths) == 1:
+                return self._confirm(start, dict(zip(chain[start:],
+                                                     paths[0])))
+            if paths:
+                # Not distinctive yet
+                break
+        # Same loop driven three times, with the shortest loop that matches
+        for shift in range(1, len(steps) // 3 + 1):
+            length = 0
+            while (length + shift < len(steps)
+                   and self._same(steps[-1 - length],
+                                  steps[-1 - length - shift])):
+                length += 1
+            if length < max(2 * shift, MATCH_EDGES):
+                continue
+            if shift == 1:
+                # All edges alike: one node or several look-alikes
+                break
+            start = len(chain) - 1 - length
+            merged = {}
+            if (start == shift and self.origin is not None
+                    and self._same(self._entry(), steps[shift - 1])):
+                # The loop goes back to the known node the robot left
+                merged[chain[shift - 1]] = self.origin
+            for i in range(start, len(chain)):
+                into = chain[i - shift]
+                merged[chain[i]] = merged.get(into, into)
+            for node in chain[start - shift:start]:
+                self.map.confirmed.add(node)
+            return self._confirm(start - shift, merged)
+        return chain[-1]
+
+    def _confirm(self, start, merged):
+        """Merge nodes of the chain from start as in merged, confirm the
+        nodes before start when the robot came from a known node (remove
+        them otherwise), return node the robot arrived at."""
+        chain = self.chain
+        for node in chain[:start]:
+            if self.origin is not None:
+                self.map.confirmed.add(node)
+            else:
+                self.map.remove(node)
+        for node in chain[start:]:
+            into = merged.get(node, node)
+            if into != node:
+                self.map.merge(node, into)
+        node = merged.get(chain[-1], chain[-1])
+        # Remove confirmed nodes no edge leads to any more, after an edge
+        # was mapped again
+        orphans = self.map.confirmed - {edge['to']
+                                        for edges in self.map.edges.values()
+                                        for edge in edges.values()}
+        for orphan in orphans - {node}:
+            self.map.remove(orphan)
+        self.chain = []
+        self.origin = None
+        self.located = True
+        return node
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+""" Find the best PID gains of the linetracker with the simulator.
+
+    Every combination of the gains below is simulated (see simulator.py),
+    in parallel on all cores of the computer:
+
+        python3 tune.py [seconds] [processes]
+
+    The gains are scored on lap time and on the distance between the robot
+    and the line, the best ones are printed. Copy them to KP, KI, KD and KF
+    in linetracker.py. Robot.move() multiplies the output of the
+    PID-controller by _GAIN in robot.py, so only the products with _GAIN
+    matter: _GAIN is not varied, it would only repeat the same gains.
+"""
+import sys
+from itertools import product
+from multiprocessing import Pool, cpu_count
+from time import perf_counter
+
+from simulator import Simulation
+
+# Gains to try
+KP_VALUES = (0.2, 0.4, 0.6, 0.8, 1.0, 1.2, 1.4, 1.6)
+KI_VALUES = (0.0, 0.002, 0.005)
+KD_VALUES = (0.0, 0.5, 1.0, 2.0)
+KF_VALUES = (0.0, 0.2)
+
+ERROR_WEIGHT = 0.1   # Seconds of lap time per mm of mean tracking error
+BEST = 10            # Number of best gains to print
+
+
+def score(results):
+    """Return score of simulation results, lower is better."""
+    if results['lost'] or not results['laps']:
+        return float('inf')
+    mean_lap = sum(results['laps']) / len(results['laps'])
+    return mean_lap + ERROR_WEIGHT * results['mean_error']
+
+
+def episode(args):
+    """Simulate one set of gains, return (score, gains, results)."""
+    gains, duration = args
+    kp, ki, kd, kf = gains
+    results = Simulation(kp=kp, ki=ki, kd=kd, kf=kf).run(duration)
+    return score(results), gains, results
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 50.0
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else cpu_count()
+    episodes = [(gains, duration) for gains in
+                product(KP_VALUES, KI_VALUES, KD_VALUES, KF_VALUES)]
+    print('Simulating {} gains of {:.0f} s with {} processes'.format(
+        len(episodes), duration, processes))
+    start = perf_counter()
+    with Pool(processes) as pool:
+        scores = list(pool.imap_unordered(episode, episodes))
+    print('Done in {:.1f} s'.format(perf_counter() - start))
+    scores.sort(key=lambda item: item[0])
+    print('{:>6}{:>8}{:>8}{:>6}{:>9}{:>10}{:>10}'.format(
+        'KP', 'KI', 'KD', 'KF', 'lap', 'error', 'score'))
+    for value, (kp, ki, kd, kf), results in scores[:BEST]:
+        if results['laps']:
+            lap = '{:.2f}'.format(sum(results['laps']) / len(results['laps']))
+        else:
+            lap = '-'
+        print('{:>6}{:>8}{:>8}{:>6}{:>9}{:>10.1f}{:>10.2f}'.format(
+            kp, ki, kd, kf, lap, results['mean_error'], value))
+    lost = sum(1 for item in scores if item[2]['lost'])
+    if lost:
+        print('{} of {} gains lost the line'.format(lost, len(scores)))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,21 +13,37 @@
                   - LEGO TouchSensor, attached to input port 4.
                   - Two LEGO LargeMotors, attached to output ports A and B.
         Software: - ev3dev operating system.
-                  - Python module smbus (already available in ev3dev).
+                  - The common directory of this repository.
 
     Kees Smit, 2019
     github:  github.com/KWSmit
     website: kwsmit.github.io
 '''
 
-from time import sleep
-from smbus import SMBus
+import os
+import sys
+from time import monotonic
 
 from ev3dev2.sensor import INPUT_1, INPUT_4
 from ev3dev2.sensor.lego import TouchSensor
 from ev3dev2.motor import LargeMotor, OUTPUT_A, OUTPUT_B
 from ev3dev2.port import LegoPort
 
+# Modules shared by the examples, in the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..'))
+from common.startup import Startup, connect_pixy2
+from common.pixy2 import Blocks
+from common.scheduler import Scheduler
+from common.motors import MotorCommand
+from common.tracker import TargetTracker
+from common.realtime import RealTime
+from common.telemetry import Telemetry
+
+# Measure how long each phase of starting takes
+startup = Startup()
+startup.phase('imports')
+
 
 def limit_speed(speed):
     """ Limit speed in range [-1000,1000] """
@@ -40,23 +56,24 @@ def limit_speed(speed):
 # Set LEGO port for Pixy2 on input port 1
 in1 = LegoPort(INPUT_1)
 in1.mode = 'other-i2c'
-# Short wait for port to get ready
-sleep(0.5)
 
-# Settings for I2C (SMBus(3) for INPUT_1)
-bus = SMBus(3)
-# Make sure the same address is set in Pixy2
-address = 0x54
+# Connect Pixy2 (/dev/i2c-3 for INPUT_1), as soon as it answers
+# Make sure address 0x54 is set in Pixy2
+pixy2 = connect_pixy2()
+startup.phase('pixy2')
 
-# Signatures we're interested in (SIG1)
+# Signatures we're interested in (bitmap, SIG1 only)
 sig = 1
+blocks = Blocks()
 
 # Connect TouchSensor (to stop script)
 ts = TouchSensor(INPUT_4)
 
-# Connect LargeMotors
-rmotor = LargeMotor(OUTPUT_A)
-lmotor = LargeMotor(OUTPUT_B)
+# Connect LargeMotors, only send changed commands to them
+rmotor = MotorCommand(LargeMotor(OUTPUT_A))
+lmotor = MotorCommand(LargeMotor(OUTPUT_B))
+startup.phase('sensors and motors')
+startup.dump()
 
 # Defining constants
 X_REF = 158  # X-coordinate of referencepoint
@@ -65,6 +82,8 @@ KP = 0.4     # Proportional constant PID-controller
 KI = 0.01    # Integral constant PID-controller
 KD = 0.05    # Derivative constant PID-controller
 GAIN = 10    # Gain for motorspeed
+LOOP_FREQUENCY = 60  # Loops per second, PID constants depend on it
+LEAD = 0.05  # Seconds to look ahead, to lead a moving target
 
 # Initializing PID variables
 integral_x = 0
@@ -74,18 +93,39 @@ integral_y = 0
 derivative_y = 0
 last_dy = 0
 
-# Data for requesting block
-data = [174, 193, 32, 2, sig, 1]
+# Estimate position of SIG1-object between frames and when it's missing
+# in a few frames
+tracker = TargetTracker()
+
+# Run control loop at a fixed rate
+scheduler = Scheduler(LOOP_FREQUENCY)
+# Stream target, PID-controller and motors to a computer (see telemetry.py)
+telemetry = Telemetry()
+telemetry.start()
+# Real-time mode (garbage collection in slack time, high priority) with
+# the argument --realtime
+realtime = RealTime(enabled='--realtime' in sys.argv)
+realtime.enter()
+scheduler.idle = realtime.idle
 
 while not ts.value():
-    # Request block
-    bus.write_i2c_block_data(address, 0, data)
-    # Read block
-    block = bus.read_i2c_block_data(address, 0, 20)
-    if sig == block[7]*256 + block[6]:
+    scheduler.wait()
+    # Request and read largest block in one transaction
+    blocks = pixy2.get_blocks(sig, 1, blocks)
+    now = monotonic()
+    if blocks.number_of_blocks > 0:
+        if blocks.new:
+            # Largest SIG1-object in a new frame
+            block = blocks.blocks[0]
+            tracker.update(block.x, block.y, block.width, now)
+        else:
+            # Same data as the previous frame, SIG1-object is still there
+            tracker.seen(now)
+    # Estimated position of SIG1-object, a little ahead in time
+    target = tracker.predict(now + LEAD)
+    if target is not None:
         # SIG1 detected, control motors
-        x = block[9]*256 + block[8]   # X-centroid of largest SIG1-object
-        y = block[11]*256 + block[10] # Y-centroid of largest SIG1-object
+        x, y = target[:2]             # X/Y-centroid of SIG1-object
         dx = X_REF - x                # Error in reference to X_REF
         integral_x = integral_x + dx  # Calculate integral for PID
         derivative_x = dx - last_dx   # Calculate derivative for PID
@@ -99,17 +139,24 @@ while not ts.value():
         # but limit in range [-1000,1000]
         rspeed = limit_speed(GAIN*(speed_y - speed_x))
         lspeed = limit_speed(GAIN*(speed_y + speed_x))
-        rmotor.run_forever(speed_sp = round(rspeed))
-        lmotor.run_forever(speed_sp = round(lspeed))
+        rmotor.run(rspeed)
+        lmotor.run(lspeed)
         last_dx = dx                  # Set last error for x
         last_dy = dy                  # Set last error for y
+        telemetry.publish(x, y, dx, integral_x, derivative_x, speed_x,
+                          rspeed, lspeed)
     else:
-        # SIG1 not detected, stop motors
+        # SIG1 not detected for a while, stop motors
         rmotor.stop()
         lmotor.stop()
         last_dx = 0
         last_dy = 0
+        telemetry.publish(None, None)
 
 # TouchSensor pressed, stop motors
 rmotor.stop()
 lmotor.stop()
+realtime.exit()
+telemetry.stop()
+print(scheduler.report())
+print(realtime.report())
@@ -19,24 +19,37 @@
                     I2C Address = 0x54.
                   - LEGO TouchSensor, attached to input port 4.
         Software: - ev3dev operating system.
-                  - Python module smbus (already available in ev3dev).
+                  - The common directory of this repository.
 
     Kees Smit, 2019
     github:  github.com/KWSmit
     website: kwsmit.github.io
 '''
 
-from time import sleep
-from smbus import SMBus
+import os
+import sys
 
 from ev3dev2.display import Display
 from ev3dev2.sensor import INPUT_1, INPUT_4
 from ev3dev2.sensor.lego import TouchSensor
 from ev3dev2.port import LegoPort
 
+# Modules shared by the examples, in the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..'))
+from common.startup import Startup, connect_pixy2
+from common.display import BoxDisplay
+from common.camera import CameraStream, Pixy2Camera
 
-# EV3 Display
+# Measure how long each phase of starting takes
+startup = Startup()
+startup.phase('imports')
+
+
+# EV3 Display, only redrawn when the rectangles move
 lcd = Display()
+box_display = BoxDisplay(lcd)
+startup.phase('display')
 
 # Connect ToucSensor
 ts = TouchSensor(INPUT_4)
@@ -44,49 +57,49 @@ ts = TouchSensor(INPUT_4)
 # Set LEGO port for Pixy2 on input port 1
 in1 = LegoPort(INPUT_1)
 in1.mode = 'other-i2c'
-# Short wait for port to get ready
-sleep(0.5)
 
-# Settings for I2C (SMBus(3) for INPUT_1)
-bus = SMBus(3)
-# Make sure the same address is set in Pixy2
-address = 0x54
+# Connect Pixy2 (/dev/i2c-3 for INPUT_1), as soon as it answers
+# Make sure address 0x54 is set in Pixy2
+pixy2 = connect_pixy2()
+startup.phase('pixy2')
+startup.dump()
 
-# Signatures we're interested in (SIG1)
+# Signatures we're interested in (bitmap, SIG1 only)
 sigs = 1
+# Maximum number of blocks to display
+MAX_BLOCKS = 4
+# Read frames with detected objects in the background, only the latest
+# frame is used
+camera = CameraStream(Pixy2Camera(pixy2, sigs, MAX_BLOCKS))
+camera.start()
 
-# Data for requesting block
-data = [174, 193, 32, 2, sigs, 1]
-
-# Read and display data until TouchSensor is pressed
-while not ts.value():
-    # Clear display
-    lcd.clear()
-    # Request block
-    bus.write_i2c_block_data(address, 0, data)
-    # Read block
-    block = bus.read_i2c_block_data(address, 0, 20)
-    # Extract data
-    sig = block[7]*256 + block[6]
-    x = block[9]*256 + block[8]
-    y = block[11]*256 + block[10]
-    w = block[13]*256 + block[12]
-    h = block[15]*256 + block[14]
-    # Scale to resolution of EV3 display:
-    # Resolution Pixy2 while color tracking; (316x208)
-    # Resolution EV3 display: (178x128)
-    x *= 0.6
-    y *= 0.6
-    w *= 0.6
-    h *= 0.6
-    # Calculate rectangle to draw on display
-    dx = int(w/2)
-    dy = int(h/2)
-    xa = x - dx
-    ya = y + dy
-    xb = x + dx
-    yb = y - dy
-    # Draw rectangle on display
-    lcd.draw.rectangle((xa, ya, xb, yb), fill='black')
-    # Update display to how rectangle
-    lcd.update()
+# Display new frames until TouchSensor is pressed
+boxes = []
+for frame in camera.frames(timeout=0.1):
+    if ts.value():
+        break
+    if frame is None:
+        # No new frame within 0.1 s, show the last boxes again: the display
+        # skips changes that come too soon after the previous update
+        box_display.show(boxes)
+        continue
+    boxes = []
+    for detection in frame.detections:
+        # Scale to resolution of EV3 display:
+        # Resolution Pixy2 while color tracking; (316x208)
+        # Resolution EV3 display: (178x128)
+        x = detection.x * 0.6
+        y = detection.y * 0.6
+        w = detection.width * 0.6
+        h = detection.height * 0.6
+        # Calculate rectangle to draw on display
+        dx = int(w/2)
+        dy = int(h/2)
+        xa = x - dx
+        ya = y + dy
+        xb = x + dx
+        yb = y - dy
+        boxes.append((xa, ya, xb, yb))
+    # Show rectangles on display
+    box_display.show(boxes)
+camera.stop()
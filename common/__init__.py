@@ -0,0 +1,7 @@
+""" Modules shared by the examples for Pixy and Pixy2.
+
+    The example scripts add the root of the repository to sys.path and
+    import the modules from this package, for example:
+
+        from common.scheduler import Scheduler
+"""
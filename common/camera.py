@@ -0,0 +1,217 @@
+""" One stream of detected objects for Pixy (v1) and Pixy2."""
+import asyncio
+from queue import Queue, Empty, Full
+from threading import Condition, Thread
+from time import monotonic, sleep
+
+from .pixy2 import Blocks
+
+
+class Detection:
+    """Object detected by the camera, position and size in pixels."""
+    __slots__ = ('signature', 'x', 'y', 'width', 'height')
+
+    def __init__(self, signature, x, y, width, height):
+        self.signature = signature
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+
+class Frame:
+    """Detected objects of one frame, time is time.monotonic()."""
+    __slots__ = ('sequence', 'time', 'detections')
+
+    def __init__(self, sequence, time, detections):
+        self.sequence = sequence
+        self.time = time
+        self.detections = detections
+
+
+class PixyCamera:
+    """Detections of Pixy (v1) in mode SIG1 .. SIG7.
+
+    reader is a pixy.PixyReader of the sensor. Pixy only gives the largest
+    object of the signature.
+    """
+    def __init__(self, reader, signature=1):
+        self.reader = reader
+        self.signature = signature
+        self._values = None
+
+    def read(self):
+        """Return list of Detections, None when nothing changed."""
+        values = self.reader.read()
+        if values == self._values:
+            return None
+        self._values = values
+        count, x, y, width, height = values[:5]
+        if count == 0:
+            return []
+        return [Detection(self.signature, x, y, width, height)]
+
+
+class Pixy2Camera:
+    """Detections of Pixy2 (color connected components).
+
+    sigmap is a bitmap of the signatures to detect and max_blocks the
+    maximum number of objects in a frame.
+    """
+    def __init__(self, pixy2, sigmap=1, max_blocks=1):
+        self.pixy2 = pixy2
+        self.sigmap = sigmap
+        self.max_blocks = max_blocks
+        self._blocks = Blocks()
+
+    def read(self):
+        """Return list of Detections, None on errors or when nothing
+        changed."""
+        blocks = self.pixy2.get_blocks(self.sigmap, self.max_blocks,
+                                       self._blocks)
+        if blocks.error or not blocks.new:
+            return None
+        return [Detection(block.signature, block.x, block.y, block.width,
+                          block.height) for block in blocks.blocks]
+
+
+class CameraStream(Thread):
+    """Stream of Frames of a camera, read in a background thread.
+
+    Iterate over the stream (or use async for) to get the frames. With
+    queue_size 0 only the latest frame is kept: a slow consumer skips
+    frames. Otherwise up to queue_size frames are queued, and the camera
+    isn't read while the queue is full, so no frame is skipped.
+
+    The camera is read again after interval seconds when nothing changed.
+    Read errors of the sensor (OSError, also I2C errors) are counted, and
+    the camera is read again after interval seconds as well. Any other
+    exception of the camera stops the stream, and is raised again by
+    next_frame().
+    """
+    def __init__(self, camera, queue_size=0, interval=0.004):
+        super().__init__(daemon=True)
+        self.camera = camera
+        self.interval = interval
+        self._running = False
+        self.errors = 0
+        self.exception = None
+        self._queue = Queue(queue_size) if queue_size > 0 else None
+        # Latest frame and sequence number of the frame last returned
+        self._condition = Condition()
+        self._frame = None
+        self._sequence = 0
+
+    def start(self):
+        self._running = True
+        super().start()
+
+    def run(self):
+        try:
+            self._read()
+        except Exception as e:
+            # Stop the stream, next_frame() raises the exception
+            self.exception = e
+            self._running = False
+        with self._condition:
+            self._condition.notify_all()
+
+    def _read(self):
+        """Read the camera until the stream stops."""
+        sequence = 0
+        while self._running:
+            try:
+                detections = self.camera.read()
+            except OSError:
+                # Try again after a while
+                self.errors += 1
+                sleep(self.interval)
+                continue
+            if detections is None:
+                sleep(self.interval)
+                continue
+            sequence += 1
+            frame = Frame(sequence, monotonic(), detections)
+            if self._queue is None:
+                with self._condition:
+                    self._frame = frame
+                    self._condition.notify_all()
+            else:
+                self._put(frame)
+
+    def _put(self, frame):
+        """Put frame in the queue, wait while it's full."""
+        while self._running:
+            try:
+                self._queue.put(frame, timeout=0.1)
+                return
+            except Full:
+                pass
+
+    def next_frame(self, timeout=None):
+        """Return next frame, or None after timeout seconds without one or
+        when the stream has stopped. Raises the exception of the camera
+        that stopped the stream."""
+        if self._queue is not None:
+            end = None if timeout is None else monotonic() + timeout
+            while self._running or not self._queue.empty():
+                # Wake up regularly to check whether the stream stopped
+                wait = 0.1 if end is None else min(0.1, end - monotonic())
+                if wait <= 0:
+                    return None
+                try:
+                    return self._queue.get(timeout=wait)
+                except Empty:
+                    pass
+            self._check()
+            return None
+        with self._condition:
+            self._condition.wait_for(
+                lambda: not self._running or (
+                    self._frame is not None
+                    and self._frame.sequence != self._sequence),
+                timeout)
+            frame = self._frame
+            if frame is None or frame.sequence == self._sequence:
+                self._check()
+                return None
+            self._sequence = frame.sequence
+            return frame
+
+    def frames(self, timeout=None):
+        """Generator of frames until the stream stops.
+
+        With a timeout, None is generated after timeout seconds without a
+        new frame, so the consumer can check other things.
+        """
+        while self._running:
+            frame = self.next_frame(timeout)
+            if frame is None and (timeout is None or not self._running):
+                continue
+            yield frame
+        self._check()
+
+    def __iter__(self):
+        return self.frames()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while self._running:
+            frame = await asyncio.get_event_loop().run_in_executor(
+                None, self.next_frame, 0.1)
+            if frame is not None:
+                return frame
+        self._check()
+        raise StopAsyncIteration
+
+    def _check(self):
+        """Raise the exception of the camera that stopped the stream."""
+        if self.exception is not None:
+            raise self.exception
+
+    def stop(self):
+        """Stop reading the camera and wait for the thread to finish."""
+        self._running = False
+        self.join()
@@ -0,0 +1,52 @@
+""" Draw detected objects on the EV3 display, only when they change."""
+from time import monotonic
+
+
+class BoxDisplay:
+    """Draw rectangles (boxes) on the EV3 display.
+
+    Clearing and updating the display every loop takes a lot of time, so
+    the display is only redrawn when a box moved more than threshold
+    pixels, and at most max_fps times per second. Only the previous boxes
+    are erased, instead of clearing the whole display. Note that
+    lcd.update() still writes the whole framebuffer, ev3dev2 can't update
+    a part of the display.
+    """
+    def __init__(self, lcd, threshold=2, max_fps=10):
+        self.lcd = lcd
+        self.threshold = threshold
+        self.interval = 1.0 / max_fps
+        self._boxes = []
+        self._time = 0.0
+        self.lcd.clear()
+        self.lcd.update()
+
+    def _changed(self, boxes):
+        """Return True when boxes differ from the boxes on the display."""
+        if len(boxes) != len(self._boxes):
+            return True
+        for box, old_box in zip(boxes, self._boxes):
+            for a, b in zip(box, old_box):
+                if abs(a - b) > self.threshold:
+                    return True
+        return False
+
+    def show(self, boxes):
+        """Show boxes, a list of (xa, ya, xb, yb) rectangles.
+
+        Returns True when the display has been updated.
+        """
+        if not self._changed(boxes):
+            return False
+        now = monotonic()
+        if now - self._time < self.interval:
+            return False
+        # Erase previous boxes and draw new ones
+        for box in self._boxes:
+            self.lcd.draw.rectangle(box, fill='white', outline='white')
+        for box in boxes:
+            self.lcd.draw.rectangle(box, fill='black')
+        self.lcd.update()
+        self._boxes = [tuple(box) for box in boxes]
+        self._time = now
+        return True
@@ -0,0 +1,52 @@
+""" Motor commands that only write to the motor when something changes."""
+from time import monotonic
+
+
+class MotorCommand:
+    """Send commands to a motor only when they change.
+
+    Every command to an ev3dev motor means writing sysfs attributes, even
+    when the speed is the same as before. MotorCommand remembers the last
+    command and skips it when it hasn't changed. Optionally small speed
+    changes (deadband, in deg/s) are skipped too, and a running motor gets
+    a new speed at most every min_interval seconds.
+    """
+    def __init__(self, motor, deadband=0, min_interval=0.0, stop_action=None):
+        self.motor = motor
+        self.deadband = deadband
+        self.min_interval = min_interval
+        if stop_action is not None:
+            self.motor.stop_action = stop_action
+        # Last commanded speed, None when the motor is stopped
+        self._speed = None
+        self._time = 0.0
+
+    @property
+    def speed(self):
+        """Last commanded speed (0 when stopped)."""
+        return self._speed or 0
+
+    def run(self, speed):
+        """Run motor forever at speed (deg/s)."""
+        speed = round(speed)
+        if self._speed is not None:
+            if abs(speed - self._speed) <= self.deadband:
+                return
+            now = monotonic()
+            if now - self._time < self.min_interval:
+                return
+            self._time = now
+        else:
+            self._time = monotonic()
+        self.motor.run_forever(speed_sp=speed)
+        self._speed = speed
+
+    def stop(self):
+        """Stop motor, using the stop action of the motor."""
+        if self._speed is not None:
+            self.motor.stop()
+            self._speed = None
+
+    def reset(self):
+        """Forget the last command, so the next command is always sent."""
+        self._speed = None
@@ -0,0 +1,536 @@
+""" Classes and constants for pixy2 linetracking."""
+import struct
+from threading import Lock
+from time import monotonic, sleep
+
+from .transport import I2CTransport
+
+# Sizes and layouts of the features in the main features payload
+VECTOR_SIZE = 6
+INTERSECTION_SIZE = 28
+BARCODE_SIZE = 4
+MAX_BRANCHES = 6
+_VECTOR = struct.Struct('<6B')        # x0, y0, x1, y1, index, flags
+_INTERSECTION = struct.Struct('<3Bx') # x, y, nr_of_branches, reserved
+_BRANCH = struct.Struct('<Bxh')       # index, reserved, angle
+_BARCODE = struct.Struct('<4B')       # x, y, flags, code
+
+# Layout of a block (color connected components):
+# signature, x, y, width, height, angle, index, age
+_BLOCK = struct.Struct('<5HhBB')
+BLOCK_SIZE = _BLOCK.size
+
+# Responses
+HEADER_SIZE = 6
+SYNC = bytes((175, 193))  # 0xc1af, sync word of responses with checksum
+RETRIES = 2               # Number of times a request is retried on errors
+MAX_RESYNC = 64           # Maximum number of bytes searched for sync word
+_RESULT = struct.Struct('<i')
+# hardware, firmware major, minor, build, firmware type
+_VERSION = struct.Struct('<HBBH10s')
+
+# Requests that never change
+REQUEST_VERSION = bytes((174, 193, 14, 0))
+REQUEST_LAMP_ON = bytes((174, 193, 22, 2, 1, 0))
+REQUEST_LAMP_OFF = bytes((174, 193, 22, 2, 0, 0))
+REQUEST_MAIN_FEATURES = bytes((174, 193, 48, 2, 0, 7))
+_TURN_REQUEST = struct.Struct('<4Bh')   # 174, 193, type, length, angle
+
+# Features of linetracking (bitmap), see set_features()
+FEATURE_VECTOR = 1
+FEATURE_INTERSECTION = 2
+FEATURE_BARCODE = 4
+FEATURES_ALL = 7
+# Requests for the main features (of the vector Pixy2 follows) or all
+# features Pixy2 detects, for every bitmap of features
+_FEATURES_REQUESTS = {
+    (all_features, features): bytes((174, 193, 48, 2, all_features, features))
+    for all_features in (0, 1) for features in range(0, FEATURES_ALL + 1)}
+
+# Barcode constants
+BARCODE_FORWARD = 1
+BARCODE_LEFT = 0
+BARCODE_RIGHT = 5
+BARCODE_DEACTIVATE = 12
+BARCODE_ACTIVATE = 13
+
+
+class Pixy2:
+    def __init__(self, transport=None):
+        # Set address for i2c communication (set on Pixy2 camera with PixyMon)
+        self.i2c_address = 0x54
+        if transport is None:
+            transport = I2CTransport(3, self.i2c_address)
+        self.transport = transport
+        # Lock for using Pixy2 from more than one thread
+        self._lock = Lock()
+        # Statistics of communication errors
+        self.sync_errors = 0
+        self.resyncs = 0
+        self.checksum_errors = 0
+        self.io_errors = 0
+        # Last payload of each request, to detect new frames
+        self._last_payloads = {}
+        # Optional timing.Timings to measure the stages of requests
+        self.timings = None
+        # Settings for linetraacking (see wiki Pixycam.com)
+        self._mode = 0
+        self._default_turn = 0
+        self._next_turn = 0
+        # Request of getdata(), see set_features()
+        self._features_request = REQUEST_MAIN_FEATURES
+
+    def get_version(self):
+        """Return (hardware, major, minor, build, type) of the firmware.
+
+        Returns None when Pixy2 doesn't answer correctly.
+        """
+        packet_type, payload = self._receive(REQUEST_VERSION, _VERSION.size)
+        if packet_type != 15 or len(payload) < _VERSION.size:
+            return None
+        hardware, major, minor, build, firmware_type = _VERSION.unpack_from(
+            payload)
+        return (hardware, major, minor, build,
+                firmware_type.split(b'\0')[0].decode('ascii', 'replace'))
+
+    def lamp_on(self):
+        """Turn lamp on."""
+        with self._lock:
+            self.transport.write(REQUEST_LAMP_ON)
+
+    def lamp_off(self):
+        """Turn lamp off."""
+        with self._lock:
+            self.transport.write(REQUEST_LAMP_OFF)
+
+    def set_mode(self, mode):
+        """Set mode for Pixy2."""
+        with self._lock:
+            self.transport.write(bytes((174, 193, 54, 1, mode)))
+        self._mode = mode
+
+    def set_features(self, features=FEATURES_ALL, all_features=False):
+        """Set the features getdata() requests.
+
+        features is a bitmap of FEATURE_VECTOR, FEATURE_INTERSECTION and
+        FEATURE_BARCODE. Pixy2 only sends the requested features, so fewer
+        features means fewer bytes to read. With all_features Pixy2 sends
+        all lines it detects, instead of only the vector it follows. This
+        can be changed every frame, for example to only request
+        intersections when one is in sight.
+        """
+        self._features_request = _FEATURES_REQUESTS[
+            (1 if all_features else 0, features)]
+
+    @property
+    def features(self):
+        """Bitmap of the features getdata() requests."""
+        return self._features_request[5]
+
+    def getdata(self, mainfeatures=None):
+        """Get linetracking data form pixy2.
+
+        When mainfeatures is given, it is cleared and filled with the new
+        data, so the same objects can be reused every loop.
+        """
+        if mainfeatures is None:
+            mainfeatures = MainFeatures()
+        else:
+            mainfeatures.clear()
+
+        # Request and read header and payload
+        request = self._features_request
+        packet_type, payload = self._receive(request)
+        if packet_type == 49:
+            mainfeatures.type_of_packet = packet_type
+        else:
+            mainfeatures.error = True
+            return mainfeatures
+        mainfeatures.length_of_payload = len(payload)
+        mainfeatures.new = self._is_new(request, payload)
+
+        # Parse payload data in place
+        timings = self.timings
+        if timings is not None:
+            t = timings.start()
+        offset = 0
+        while offset + 2 <= len(payload):
+            # Feature type and feature_length
+            feature_type = payload[offset]
+            feature_length = payload[offset+1]
+            offset += 2
+            end = offset + feature_length
+            if end > len(payload):
+                # Truncated feature
+                mainfeatures.error = True
+                break
+            if feature_type == 1:
+                # Feature type is 'vector'
+                for i in range(offset, end - VECTOR_SIZE + 1, VECTOR_SIZE):
+                    vector = mainfeatures.new_vector()
+                    (vector.x0, vector.y0, vector.x1, vector.y1,
+                     vector.index, vector.flags) = _VECTOR.unpack_from(
+                         payload, i)
+            elif feature_type == 2:
+                # feature type is 'intersection'
+                for i in range(offset, end - INTERSECTION_SIZE + 1,
+                               INTERSECTION_SIZE):
+                    intersection = mainfeatures.new_intersection()
+                    (intersection.x, intersection.y,
+                     intersection.nr_of_branches) = _INTERSECTION.unpack_from(
+                         payload, i)
+                    for j in range(0, min(intersection.nr_of_branches,
+                                          MAX_BRANCHES)):
+                        k = i + _INTERSECTION.size + j*_BRANCH.size
+                        branch = intersection.new_branch()
+                        (branch.index, branch.angle) = _BRANCH.unpack_from(
+                            payload, k)
+                        branch.angle_byte1 = payload[k+2]
+                        branch.angle_byte2 = payload[k+3]
+            elif feature_type == 4:
+                # Feature type is 'barcode'
+                for i in range(offset, end - BARCODE_SIZE + 1, BARCODE_SIZE):
+                    barcode = mainfeatures.new_barcode()
+                    (barcode.x, barcode.y,
+                     barcode.flags, barcode.code) = _BARCODE.unpack_from(
+                         payload, i)
+            else:
+                # Unknown feature type
+                mainfeatures.error = True
+            offset = end
+        if timings is not None:
+            timings.add('pixy2.parse', t)
+
+        # Return data
+        return mainfeatures
+
+    def get_blocks(self, sigmap=255, max_blocks=1, blocks=None):
+        """Get blocks (color connected components) from pixy2.
+
+        sigmap is a bitmap of the signatures to detect (1 for signature 1,
+        2 for signature 2, 4 for signature 3, etc.) and max_blocks the
+        maximum number of blocks to return. The request and all blocks
+        are read in one transaction, so keep max_blocks as low as
+        possible. When blocks is given, it is cleared and filled with the
+        new data.
+        """
+        if blocks is None:
+            blocks = Blocks()
+        else:
+            blocks.clear()
+
+        # Request and read header and blocks
+        request_block = bytes((174, 193, 32, 2, sigmap, max_blocks))
+        packet_type, payload = self._receive(request_block,
+                                             max_blocks*BLOCK_SIZE)
+        if packet_type != 33:
+            blocks.error = True
+            return blocks
+        blocks.new = self._is_new(request_block, payload)
+
+        # Parse blocks in place
+        timings = self.timings
+        if timings is not None:
+            t = timings.start()
+        for i in range(0, len(payload) - BLOCK_SIZE + 1, BLOCK_SIZE):
+            block = blocks.new_block()
+            (block.signature, block.x, block.y, block.width, block.height,
+             block.angle, block.index, block.age) = _BLOCK.unpack_from(
+                 payload, i)
+        if timings is not None:
+            timings.add('pixy2.parse', t)
+
+        # Return data
+        return blocks
+
+    def set_vector(self, index):
+        """Set vector for Pixy2 to follow."""
+        request_block = bytes((174, 193, 56, 1, index))
+        return self._result(request_block)
+
+    def set_next_turn(self, angle):
+        """Set direction robot has to take at intersection."""
+        request_block = _TURN_REQUEST.pack(174, 193, 58, 2, angle)
+        response = self._result(request_block)
+        self._next_turn = angle
+        return response
+
+    def set_default_turn(self, angle):
+        """"Set direction robot has to take at intersection."""
+        request_block = _TURN_REQUEST.pack(174, 193, 60, 2, angle)
+        response = self._result(request_block)
+        self._default_turn = angle
+        return response
+
+    def get_new_data(self, mainfeatures=None, timeout=0.1, interval=0.002):
+        """Get linetracking data of a new frame of pixy2.
+
+        Reads data every interval seconds until it differs from the
+        previous data, or until timeout seconds have passed. Check
+        mainfeatures.new to know whether a new frame was read.
+        """
+        end = monotonic() + timeout
+        mainfeatures = self.getdata(mainfeatures)
+        while not (mainfeatures.new or mainfeatures.error):
+            if monotonic() + interval > end:
+                break
+            sleep(interval)
+            mainfeatures = self.getdata(mainfeatures)
+        return mainfeatures
+
+    def _is_new(self, request, payload):
+        """Return True when payload differs from the last one of request.
+
+        Pixy2 has no frame counter, so a frame is new when its data
+        changed. Reading faster than the frame rate of the camera returns
+        the same data again, and that is no new information anyway.
+        """
+        if self._last_payloads.get(request) == payload:
+            return False
+        self._last_payloads[request] = bytes(payload)
+        return True
+
+    def _result(self, request):
+        """Send request and return the result of Pixy2 (None on errors)."""
+        packet_type, payload = self._receive(request, _RESULT.size)
+        if packet_type != 1 or len(payload) < _RESULT.size:
+            return None
+        return _RESULT.unpack_from(payload)[0]
+
+    def _receive(self, request, length=0):
+        """Send request and return type and payload of the response.
+
+        The header and length bytes of payload are read in one transaction
+        with the request, the rest of the payload is read after that.
+        When the response doesn't start with the sync word, the sync word
+        is searched to recover the packet. When no valid packet is found,
+        its checksum is wrong or the transport fails (OSError), the request
+        is retried. Returns (None, None) when all retries fail.
+        """
+        with self._lock:
+            for retry in range(0, RETRIES + 1):
+                try:
+                    response = self._read_response(request, length)
+                except OSError:
+                    self.io_errors += 1
+                    continue
+                if response is not None:
+                    return response
+        return None, None
+
+    def _read_response(self, request, length):
+        """Send request once, return type and payload of the response, or
+        None when no valid packet was found."""
+        timings = self.timings
+        if timings is not None:
+            t = timings.start()
+        data = self.transport.transfer(request, HEADER_SIZE + length)
+        if timings is not None:
+            t = timings.add('pixy2.transfer', t)
+        # Find sync word
+        start = data.find(SYNC)
+        searched = len(data)
+        while start < 0 and searched < MAX_RESYNC:
+            # Keep last byte, it can be the first byte of the sync
+            data = data[-1:] + self.transport.read(HEADER_SIZE)
+            searched += HEADER_SIZE
+            start = data.find(SYNC)
+        if start < 0:
+            self.sync_errors += 1
+            return None
+        if start > 0:
+            self.resyncs += 1
+            data = data[start:]
+        # Read rest of header and payload
+        if len(data) < HEADER_SIZE:
+            data += self.transport.read(HEADER_SIZE - len(data))
+        end = HEADER_SIZE + data[3]
+        if len(data) < end:
+            data += self.transport.read(end - len(data))
+        if timings is not None:
+            timings.add('pixy2.read', t)
+        # Check checksum
+        payload = memoryview(data)[HEADER_SIZE:end]
+        if sum(payload) & 0xffff == data[4] + data[5]*256:
+            return data[2], payload
+        self.checksum_errors += 1
+        return None
+
+
+class Vector:
+    __slots__ = ('x0', 'y0', 'x1', 'y1', 'index', 'flags')
+
+    def __init__(self):
+        self.x0 = 0
+        self.y0 = 0
+        self.x1 = 0
+        self.y1 = 0
+        self.index = 0
+        self.flags = 0
+
+
+class Intersection:
+    __slots__ = ('x', 'y', 'nr_of_branches', 'branches', '_branch_pool')
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+        self.nr_of_branches = 0
+        self.branches = []
+        # Preallocated branches, reused by new_branch()
+        self._branch_pool = [Branch() for i in range(0, MAX_BRANCHES)]
+
+    def add_branch(self, branch):
+        self.branches.append(branch)
+
+    def new_branch(self):
+        """Add a branch from the preallocated branches and return it."""
+        branch = _from_pool(self._branch_pool, len(self.branches), Branch)
+        self.add_branch(branch)
+        return branch
+
+    def clear(self):
+        self.nr_of_branches = 0
+        self.branches.clear()
+
+
+class Branch:
+    __slots__ = ('index', 'angle', 'angle_byte1', 'angle_byte2')
+
+    def __init__(self):
+        self.index = 0
+        self.angle = 0
+        self.angle_byte1 = 0
+        self.angle_byte2 = 0
+
+
+class Barcode:
+    __slots__ = ('x', 'y', 'flags', 'code')
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+        self.flags = 0
+        self.code = 0
+
+
+class MainFeatures:
+    """Linetracking data of one frame.
+
+    The feature objects are preallocated and reused when the frame is
+    cleared and filled again, so reading data doesn't allocate new objects.
+    """
+    __slots__ = ('error', 'new', 'type_of_packet', 'length_of_payload',
+                 'number_of_vectors', 'number_of_intersections',
+                 'number_of_barcodes', 'vectors', 'intersections', 'barcodes',
+                 '_vector_pool', '_intersection_pool', '_barcode_pool')
+
+    def __init__(self):
+        self.error = False
+        self.new = False
+        self.type_of_packet = 49
+        self.length_of_payload = 0
+        self.number_of_vectors = 0
+        self.number_of_intersections = 0
+        self.number_of_barcodes = 0
+        self.vectors = []
+        self.intersections = []
+        self.barcodes = []
+        # Preallocated features, reused by new_vector(), etc.
+        self._vector_pool = [Vector()]
+        self._intersection_pool = [Intersection()]
+        self._barcode_pool = [Barcode(), Barcode()]
+
+    def add_vector(self, vector):
+        self.vectors.append(vector)
+        self.number_of_vectors += 1
+
+    def add_intersection(self, intersection):
+        self.intersections.append(intersection)
+        self.number_of_intersections += 1
+
+    def add_barcode(self, barcode):
+        self.barcodes.append(barcode)
+        self.number_of_barcodes += 1
+
+    def new_vector(self):
+        """Add a vector from the preallocated vectors and return it."""
+        vector = _from_pool(self._vector_pool, len(self.vectors), Vector)
+        self.add_vector(vector)
+        return vector
+
+    def new_intersection(self):
+        """Add an intersection from the preallocated ones and return it."""
+        intersection = _from_pool(self._intersection_pool,
+                                  len(self.intersections), Intersection)
+        intersection.clear()
+        self.add_intersection(intersection)
+        return intersection
+
+    def new_barcode(self):
+        """Add a barcode from the preallocated barcodes and return it."""
+        barcode = _from_pool(self._barcode_pool, len(self.barcodes), Barcode)
+        self.add_barcode(barcode)
+        return barcode
+
+    def clear(self):
+        self.error = False
+        self.new = False
+        self.type_of_packet = 49
+        self.length_of_payload = 0
+        self.number_of_vectors = 0
+        self.number_of_intersections = 0
+        self.number_of_barcodes = 0
+        self.vectors.clear()
+        self.intersections.clear()
+        self.barcodes.clear()
+
+
+class Block:
+    __slots__ = ('signature', 'x', 'y', 'width', 'height', 'angle', 'index',
+                 'age')
+
+    def __init__(self):
+        self.signature = 0
+        self.x = 0
+        self.y = 0
+        self.width = 0
+        self.height = 0
+        self.angle = 0
+        self.index = 0
+        self.age = 0
+
+
+class Blocks:
+    """Blocks (color connected components) of one frame.
+
+    Like MainFeatures the blocks are preallocated and reused.
+    """
+    __slots__ = ('error', 'new', 'number_of_blocks', 'blocks', '_block_pool')
+
+    def __init__(self):
+        self.error = False
+        self.new = False
+        self.number_of_blocks = 0
+        self.blocks = []
+        self._block_pool = [Block()]
+
+    def new_block(self):
+        """Add a block from the preallocated blocks and return it."""
+        block = _from_pool(self._block_pool, len(self.blocks), Block)
+        self.blocks.append(block)
+        self.number_of_blocks += 1
+        return block
+
+    def clear(self):
+        self.error = False
+        self.new = False
+        self.number_of_blocks = 0
+        self.blocks.clear()
+
+
+def _from_pool(pool, n, cls):
+    """Return object n of pool, growing the pool with cls when needed."""
+    if n == len(pool):
+        pool.append(cls())
+    return pool[n]
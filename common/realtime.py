@@ -0,0 +1,213 @@
+""" Real-time mode for control loops: no garbage collection stalls, high
+    priority and memory that can't be swapped out."""
+import ctypes
+import ctypes.util
+import gc
+import os
+from time import perf_counter
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+class RealTime:
+    """Run the control loop with as few stalls as possible.
+
+    enter() (or with RealTime() as realtime:) does the following, as far as
+    it's available and permitted:
+
+    - Collect garbage and freeze all objects of the startup (gc.freeze(),
+      Python 3.7 and later), so they are never scanned again.
+    - Disable automatic garbage collection. Garbage is collected in the
+      slack time of the loop: set scheduler.idle = realtime.idle. When
+      the loop has no slack time, garbage is still collected when
+      max_overdue times more objects than the threshold of gc wait for
+      it, so memory doesn't keep growing.
+    - Run the thread that calls enter() with real-time priority
+      (SCHED_FIFO), so daemons can't interrupt the loop. This needs root
+      or CAP_SYS_NICE. Other threads keep their normal priority, and
+      can't run while the loop overruns. Pass the threads the loop
+      depends on (like acquisition.FrameGrabber) to enter(): they get a
+      real-time priority one higher than the loop, so the loop can't
+      starve them. They mostly wait for the camera, so they hardly delay
+      the loop.
+    - Lock the memory of the process (mlockall), so it's never swapped
+      out. This needs root or a high enough RLIMIT_MEMLOCK.
+
+    Garbage collections are timed in both modes. With enabled False
+    nothing is changed, the report then shows the stalls of collections
+    during the loop, to compare with the real-time mode.
+    """
+    def __init__(self, priority=10, lock_memory=True, min_slack=0.002,
+                 max_overdue=4, enabled=True):
+        self.priority = priority
+        self.lock_memory = lock_memory
+        self.min_slack = min_slack
+        self.max_overdue = max_overdue
+        self.enabled = enabled
+        # Features that are on, and why others are not
+        self.active = []
+        self.errors = []
+        # Statistics of garbage collections, in and outside slack time
+        self.loop_collections = 0
+        self.loop_time = 0.0
+        self.loop_max = 0.0
+        self.idle_collections = 0
+        self.idle_time = 0.0
+        self.idle_max = 0.0
+        # Collections without slack time, the loop was too late
+        self.overdue_collections = 0
+        self._in_idle = False
+        self._start = 0.0
+        self._frozen = False
+        self._libc = None
+        self._threads = []
+
+    def enter(self, threads=()):
+        """Switch to real-time mode, with started threads the loop depends
+        on."""
+        if self.enabled:
+            gc.collect()
+            if hasattr(gc, 'freeze'):
+                gc.freeze()
+                self._frozen = True
+                self.active.append('gc.freeze')
+        gc.callbacks.append(self._gc_callback)
+        if not self.enabled:
+            return self
+        gc.disable()
+        self.active.append('gc in slack time')
+        if hasattr(os, 'sched_setscheduler'):
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO,
+                                      os.sched_param(self.priority))
+                self.active.append('SCHED_FIFO {}'.format(self.priority))
+            except OSError as e:
+                self.errors.append('SCHED_FIFO: {}'.format(e.strerror))
+            for thread in threads:
+                self._raise_thread(thread)
+        if self.lock_memory:
+            self._libc = ctypes.CDLL(ctypes.util.find_library('c'),
+                                     use_errno=True)
+            if self._libc.mlockall(MCL_CURRENT | MCL_FUTURE) == 0:
+                self.active.append('mlockall')
+            else:
+                self.errors.append('mlockall: {}'.format(
+                    os.strerror(ctypes.get_errno())))
+                self._libc = None
+        return self
+
+    def exit(self):
+        """Switch back to normal mode."""
+        if self._gc_callback in gc.callbacks:
+            gc.callbacks.remove(self._gc_callback)
+        if not self.enabled:
+            return
+        if self._libc is not None:
+            self._libc.munlockall()
+            self._libc = None
+        if hasattr(os, 'sched_setscheduler'):
+            for native_id in [0] + self._threads:
+                try:
+                    os.sched_setscheduler(native_id, os.SCHED_OTHER,
+                                          os.sched_param(0))
+                except OSError:
+                    pass
+            self._threads = []
+        gc.enable()
+        if self._frozen:
+            gc.unfreeze()
+            self._frozen = False
+
+    def _raise_thread(self, thread):
+        """Run thread with a real-time priority above the loop."""
+        name = 'SCHED_FIFO {} {}'.format(self.priority + 1, thread.name)
+        # Thread id of the operating system, Python 3.8 and later
+        native_id = getattr(thread, 'native_id', None)
+        if native_id is None:
+            self.errors.append('{}: no native_id'.format(name))
+            return
+        try:
+            os.sched_setscheduler(native_id, os.SCHED_FIFO,
+                                  os.sched_param(self.priority + 1))
+            self._threads.append(native_id)
+            self.active.append(name)
+        except OSError as e:
+            self.errors.append('{}: {}'.format(name, e.strerror))
+
+    def __enter__(self):
+        return self.enter()
+
+    def __exit__(self, *args):
+        self.exit()
+
+    def idle(self, slack):
+        """Collect garbage when due and there are slack seconds left
+        (negative when the loop is late).
+
+        Generations are collected as often as automatic garbage
+        collection would. Without slack time, only when garbage collection
+        is max_overdue times overdue.
+        """
+        if not self.enabled or gc.isenabled():
+            return
+        threshold0 = gc.get_threshold()[0]
+        count0 = gc.get_count()[0]
+        if count0 < threshold0:
+            return
+        if slack < self.min_slack:
+            if count0 < self.max_overdue * threshold0:
+                return
+            # Loop keeps overrunning, collect anyway (a stall in the loop)
+            self.overdue_collections += 1
+            gc.collect(self._due_generation())
+            return
+        self._in_idle = True
+        gc.collect(self._due_generation())
+        self._in_idle = False
+
+    @staticmethod
+    def _due_generation():
+        """Return oldest generation automatic collection would collect."""
+        threshold0, threshold1, threshold2 = gc.get_threshold()
+        count0, count1, count2 = gc.get_count()
+        generation = 0
+        if count1 >= threshold1:
+            generation = 1
+            if count2 >= threshold2:
+                generation = 2
+        return generation
+
+    def _gc_callback(self, phase, info):
+        if phase == 'start':
+            self._start = perf_counter()
+            return
+        duration = perf_counter() - self._start
+        if self._in_idle:
+            self.idle_collections += 1
+            self.idle_time += duration
+            self.idle_max = max(self.idle_max, duration)
+        else:
+            self.loop_collections += 1
+            self.loop_time += duration
+            self.loop_max = max(self.loop_max, duration)
+
+    def report(self):
+        """Return real-time features and garbage collection stalls as text."""
+        lines = []
+        if self.enabled:
+            lines.append('Real-time mode: {}'.format(
+                ', '.join(self.active) or 'nothing enabled'))
+            for error in self.errors:
+                lines.append('  not enabled: {}'.format(error))
+        else:
+            lines.append('Real-time mode off')
+        lines.append('gc in loop: {} collections ({} overdue), total '
+                     '{:.2f} ms, max {:.2f} ms'.format(
+                         self.loop_collections, self.overdue_collections,
+                         self.loop_time * 1000, self.loop_max * 1000))
+        lines.append('gc in slack time: {} collections, total {:.2f} ms, '
+                     'max {:.2f} ms'.format(self.idle_collections,
+                                            self.idle_time * 1000,
+                                            self.idle_max * 1000))
+        return '\n'.join(lines)
@@ -0,0 +1,84 @@
+""" Fixed-rate scheduling of control loops."""
+from math import sqrt
+from time import monotonic, sleep
+
+
+class Scheduler:
+    """Run a control loop at a fixed frequency.
+
+    Call wait() at the start of every loop. It sleeps until the next loop
+    is due, so the time between loops (and with that the meaning of the
+    I and D constants of a PID-controller) is always the same. A loop that
+    starts too late is counted as a miss, and the schedule continues from
+    that moment instead of trying to catch up.
+
+    When idle is set, idle(slack) is called every loop before sleeping,
+    with the seconds left until the next loop (negative when the loop is
+    late), to do work that can wait (see realtime.RealTime.idle()).
+    """
+    def __init__(self, frequency):
+        self.period = 1.0 / frequency
+        self.loops = 0
+        self.misses = 0
+        self.max_period = 0.0
+        self._next = None
+        self._last = None
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self.idle = None
+
+    def wait(self):
+        """Wait until the next loop is due."""
+        now = monotonic()
+        if self._next is None:
+            self._next = now
+        else:
+            self._next += self.period
+            delay = self._next - now
+            if self.idle is not None:
+                self.idle(delay)
+                now = monotonic()
+                delay = self._next - now
+            if delay > 0:
+                sleep(delay)
+                now = monotonic()
+            else:
+                self.misses += 1
+                self._next = now
+            # Statistics of the measured periods
+            period = now - self._last
+            self._sum += period
+            self._sum_sq += period * period
+            if period > self.max_period:
+                self.max_period = period
+        self._last = now
+        self.loops += 1
+
+    def run(self, step, until):
+        """Call step() every period until until() returns True."""
+        while not until():
+            self.wait()
+            step()
+
+    @property
+    def mean_period(self):
+        """Mean measured time in seconds between loops."""
+        if self.loops < 2:
+            return 0.0
+        return self._sum / (self.loops - 1)
+
+    @property
+    def jitter(self):
+        """Standard deviation in seconds of the time between loops."""
+        if self.loops < 2:
+            return 0.0
+        mean = self.mean_period
+        variance = self._sum_sq / (self.loops - 1) - mean * mean
+        return sqrt(max(variance, 0.0))
+
+    def report(self):
+        """Return statistics of the loops as text."""
+        return ('{} loops, period {:.2f} ms (set {:.2f} ms), '
+                'jitter {:.2f} ms, max {:.2f} ms, {} missed'.format(
+                    self.loops, self.mean_period * 1000, self.period * 1000,
+                    self.jitter * 1000, self.max_period * 1000, self.misses))
@@ -0,0 +1,102 @@
+""" Fast startup: wait until hardware is ready instead of a fixed time."""
+import os
+import sys
+from time import perf_counter, sleep
+
+from .pixy2 import Pixy2
+from .transport import I2CTransport
+
+
+class Startup:
+    """Measure how long each phase of starting a script takes.
+
+    The first phase starts when the process started (see process_age()),
+    so it includes starting Python and importing the modules. Usage:
+
+        ...                             # Import modules
+        startup = Startup()
+        startup.phase('imports')
+        ...                             # Connect Pixy2
+        startup.phase('pixy2')
+        startup.dump()
+    """
+    def __init__(self):
+        self.phases = []
+        self._start = self._time = perf_counter() - process_age()
+
+    def phase(self, name):
+        """End phase name, it started at the end of the previous phase."""
+        now = perf_counter()
+        self.phases.append((name, now - self._time))
+        self._time = now
+
+    def report(self):
+        """Return duration of the phases (in ms) as text."""
+        lines = ['{:<20}{:>9.1f} ms'.format(name, duration * 1000)
+                 for name, duration in self.phases]
+        lines.append('{:<20}{:>9.1f} ms'.format(
+            'startup', (self._time - self._start) * 1000))
+        return '\n'.join(lines)
+
+    def dump(self, file=sys.stdout):
+        """Print report to file."""
+        print(self.report(), file=file)
+
+
+def process_age():
+    """Return seconds since the process started, 0.0 when unknown.
+
+    Only Linux (like ev3dev) has the start time in /proc, in clock ticks
+    since booting.
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            stat = f.read()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        # The name of the command can contain spaces, the start time is
+        # the 20th field after it
+        ticks = int(stat.rsplit(')', 1)[1].split()[19])
+        return max(0.0, uptime - ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def wait_until(ready, timeout=5.0, interval=0.01):
+    """Call ready() until it returns a true value, and return that value.
+
+    Exceptions of ready() mean not ready yet. Raises TimeoutError when
+    ready() didn't succeed within timeout seconds.
+    """
+    end = perf_counter() + timeout
+    error = None
+    while True:
+        try:
+            result = ready()
+            if result:
+                return result
+        except Exception as e:
+            error = e
+        if perf_counter() > end:
+            raise TimeoutError('Not ready after {} s{}'.format(
+                timeout, ' ({})'.format(error) if error else ''))
+        sleep(interval)
+
+
+def connect_pixy2(bus=3, address=0x54, timeout=5.0):
+    """Return Pixy2 as soon as it answers on the i2c bus.
+
+    Set the port to 'other-i2c' mode first. Instead of waiting a fixed
+    time for the port, the version of Pixy2 is requested until it answers.
+    """
+    def connect():
+        transport = I2CTransport(bus, address)
+        pixy2 = Pixy2(transport)
+        try:
+            if pixy2.get_version() is not None:
+                return pixy2
+        except OSError:
+            pass
+        transport.close()
+        return None
+    return wait_until(connect, timeout)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+""" Telemetry: stream detections, PID terms and motor speeds over UDP.
+
+    The robot publishes samples with Telemetry. A background thread sends
+    them in batches, in compact binary datagrams at a fixed rate, but only
+    while a receiver listens. Show the telemetry of the robot on your
+    computer with:
+
+        python3 common/telemetry.py <address of the robot> [print]
+
+    This plots the samples with matplotlib, or prints them when matplotlib
+    isn't installed or with print.
+"""
+import socket
+import struct
+import sys
+from collections import deque
+from threading import Thread
+from time import monotonic
+
+PORT = 5454               # UDP port of the robot
+RATE = 20                 # Datagrams per second
+HELLO_INTERVAL = 1.0      # Seconds between hellos of a receiver
+SUBSCRIBER_TIMEOUT = 5.0  # Seconds without hello before sending stops
+MAGIC = b'PXTM'
+VERSION = 1
+HELLO = MAGIC + b'HELLO'
+BYE = MAGIC + b'BYE'
+# Layout of a datagram: header and count samples
+_HEADER = struct.Struct('<4sBBI')       # magic, version, count, sequence
+_SAMPLE = struct.Struct('<fBxhh4fhh')   # time, flags, x, y, PID terms,
+                                        # speed motor A and B
+MAX_SAMPLES = 40          # Samples in one datagram (fits in 1500 bytes)
+_FLAG_DETECTED = 1
+
+
+class Telemetry(Thread):
+    """Send samples of the control loop to a receiver, in batches.
+
+    publish() only adds the values to a queue, the thread packs and sends
+    them every 1/rate seconds. Nothing is queued or sent until a receiver
+    has sent a hello, so without receiver publish() returns right away. A
+    receiver sends hellos to stay subscribed. When the loop publishes
+    more than MAX_SAMPLES samples between two datagrams, the oldest are
+    dropped.
+    """
+    def __init__(self, port=PORT, rate=RATE):
+        super().__init__(daemon=True)
+        self.rate = rate
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(('', port))
+        self._running = False
+        # Address of the receiver and time of its last hello
+        self.subscriber = None
+        self._hello = 0.0
+        self._samples = deque(maxlen=MAX_SAMPLES)
+        self._buffer = bytearray(_HEADER.size + MAX_SAMPLES * _SAMPLE.size)
+        self._start = monotonic()
+        self.sequence = 0
+        self.errors = 0
+
+    @property
+    def listening(self):
+        """True when a receiver is subscribed."""
+        return self.subscriber is not None
+
+    def publish(self, x, y, error=0, integral=0, derivative=0, output=0,
+                speed_a=0, speed_b=0):
+        """Publish position of the detected object (x None when nothing is
+        detected), the PID terms and output, and the motor speeds."""
+        if self.subscriber is None:
+            return
+        self._samples.append((monotonic() - self._start, x, y, error,
+                              integral, derivative, output, speed_a,
+                              speed_b))
+
+    def start(self):
+        self._running = True
+        super().start()
+
+    def run(self):
+        period = 1.0 / self.rate
+        next_send = monotonic()
+        while self._running:
+            next_send += period
+            self._receive(next_send)
+            now = monotonic()
+            if now > next_send:
+                next_send = now
+            if (self.subscriber is not None
+                    and now - self._hello > SUBSCRIBER_TIMEOUT):
+                # Receiver is gone
+                self.subscriber = None
+                self._samples.clear()
+            self._send()
+        self._socket.close()
+
+    def _receive(self, end):
+        """Handle hellos of receivers until time end."""
+        while True:
+            timeout = end - monotonic()
+            if timeout <= 0:
+                return
+            self._socket.settimeout(timeout)
+            try:
+                data, address = self._socket.recvfrom(64)
+            except socket.timeout:
+                return
+            except OSError:
+                self.errors += 1
+                return
+            if data == HELLO:
+                self.subscriber = address
+                self._hello = monotonic()
+            elif data == BYE and address == self.subscriber:
+                self.subscriber = None
+                self._samples.clear()
+
+    def _send(self):
+        """Send queued samples in one datagram."""
+        subscriber = self.subscriber
+        count = len(self._samples)
+        if subscriber is None or count == 0:
+            return
+        buffer = self._buffer
+        offset = _HEADER.size
+        for i in range(0, count):
+            t, x, y, error, integral, derivative, output, speed_a, speed_b = (
+                self._samples.popleft())
+            if x is None:
+                flags, x, y = 0, 0, 0
+            else:
+                flags = _FLAG_DETECTED
+            _SAMPLE.pack_into(buffer, offset, t, flags, int(x), int(y),
+                              error, integral, derivative, output,
+                              int(speed_a), int(speed_b))
+            offset += _SAMPLE.size
+        self.sequence += 1
+        _HEADER.pack_into(buffer, 0, MAGIC, VERSION, count, self.sequence)
+        try:
+            self._socket.sendto(memoryview(buffer)[:offset], subscriber)
+        except OSError:
+            self.errors += 1
+
+    def stop(self):
+        """Stop sending and wait for the thread to finish."""
+        self._running = False
+        self.join()
+
+
+class Sample:
+    """One sample received from the robot, time in seconds since the
+    telemetry started."""
+    __slots__ = ('time', 'detected', 'x', 'y', 'error', 'integral',
+                 'derivative', 'output', 'speed_a', 'speed_b')
+
+
+class TelemetryReceiver:
+    """Receive telemetry of the robot at address host.
+
+    receive() sends a hello every HELLO_INTERVAL seconds, so the robot
+    keeps sending. Lost datagrams are counted with their sequence numbers.
+    """
+    def __init__(self, host, port=PORT):
+        self.address = (host, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._hello = None
+        self.sequence = None
+        self.lost = 0
+
+    def hello(self):
+        """Subscribe to the telemetry of the robot."""
+        self._socket.sendto(HELLO, self.address)
+        self._hello = monotonic()
+
+    def receive(self, timeout=1.0):
+        """Return list of Samples of the next datagram, empty list after
+        timeout seconds without one."""
+        if self._hello is None or monotonic() - self._hello > HELLO_INTERVAL:
+            self.hello()
+        self._socket.settimeout(timeout)
+        try:
+            data = self._socket.recv(_HEADER.size
+                                     + MAX_SAMPLES * _SAMPLE.size)
+        except socket.timeout:
+            return []
+        if len(data) < _HEADER.size:
+            return []
+        magic, version, count, sequence = _HEADER.unpack_from(data, 0)
+        if (magic != MAGIC or version != VERSION
+                or len(data) < _HEADER.size + count * _SAMPLE.size):
+            return []
+        if self.sequence is not None and sequence > self.sequence + 1:
+            self.lost += sequence - self.sequence - 1
+        self.sequence = sequence
+        samples = []
+        for i in range(0, count):
+            sample = Sample()
+            (sample.time, flags, sample.x, sample.y, sample.error,
+             sample.integral, sample.derivative, sample.output,
+             sample.speed_a, sample.speed_b) = _SAMPLE.unpack_from(
+                 data, _HEADER.size + i * _SAMPLE.size)
+            sample.detected = bool(flags & _FLAG_DETECTED)
+            samples.append(sample)
+        return samples
+
+    def close(self):
+        """Unsubscribe and close the socket."""
+        self._socket.sendto(BYE, self.address)
+        self._socket.close()
+
+
+def print_samples(receiver):
+    """Print samples until Ctrl-C."""
+    while True:
+        for sample in receiver.receive():
+            if sample.detected:
+                line = '{:8.3f} object ({:3},{:3})'.format(
+                    sample.time, sample.x, sample.y)
+            else:
+                line = '{:8.3f} no object '.format(sample.time) + ' ' * 6
+            print(line + ' pid {:6.1f} {:6.1f} {:6.1f} out {:6.1f} '
+                  'motors {:4} {:4}'.format(
+                      sample.error, sample.integral, sample.derivative,
+                      sample.output, sample.speed_a, sample.speed_b))
+
+
+def plot_samples(receiver, plt, window=10.0):
+    """Plot the samples of the last window seconds until the window of the
+    plot is closed."""
+    fields = (('x', 'y'), ('error', 'integral', 'derivative', 'output'),
+              ('speed_a', 'speed_b'))
+    titles = ('Detected object', 'PID-controller', 'Motor speeds')
+    history = deque()
+    figure, axes = plt.subplots(len(fields), 1, sharex=True)
+    lines = []
+    for ax, names, title in zip(axes, fields, titles):
+        ax.set_title(title)
+        lines.append([ax.plot([], [], label=name)[0] for name in names])
+        ax.legend(loc='upper left')
+    axes[-1].set_xlabel('time (s)')
+    plt.ion()
+    plt.show()
+    while plt.fignum_exists(figure.number):
+        samples = receiver.receive(0.1)
+        if samples:
+            history.extend(samples)
+            end = history[-1].time
+            while history[0].time < end - window:
+                history.popleft()
+            times = [sample.time for sample in history]
+            for ax, names, ax_lines in zip(axes, fields, lines):
+                for name, line in zip(names, ax_lines):
+                    line.set_data(times, [getattr(sample, name)
+                                          for sample in history])
+                ax.relim()
+                ax.autoscale_view()
+            axes[-1].set_xlim(end - window, end)
+        plt.pause(0.01)
+
+
+def main():
+    receiver = TelemetryReceiver(sys.argv[1])
+    plt = None
+    if len(sys.argv) < 3 or sys.argv[2] != 'print':
+        try:
+            import matplotlib.pyplot as plt
+        except ImportError:
+            print('matplotlib not installed, printing samples')
+    try:
+        if plt is None:
+            print_samples(receiver)
+        else:
+            plot_samples(receiver, plt)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.close()
+        print('{} datagrams lost'.format(receiver.lost))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+""" Estimate position and velocity of a target between camera frames."""
+
+
+class AlphaBeta:
+    """Alpha-beta filter of one value and its velocity (per second)."""
+    __slots__ = ('alpha', 'beta', 'value', 'velocity')
+
+    def __init__(self, alpha, beta):
+        self.alpha = alpha
+        self.beta = beta
+        self.value = 0.0
+        self.velocity = 0.0
+
+    def reset(self, value):
+        self.value = value
+        self.velocity = 0.0
+
+    def update(self, measurement, dt):
+        """Correct the prediction of dt seconds with measurement."""
+        predicted = self.value + self.velocity * dt
+        residual = measurement - predicted
+        self.value = predicted + self.alpha * residual
+        if dt > 0:
+            self.velocity += self.beta * residual / dt
+
+    def predict(self, dt):
+        """Return value dt seconds after the last update."""
+        return self.value + self.velocity * dt
+
+
+class TargetTracker:
+    """Filter x, y and width of a target and predict them between frames.
+
+    Every new frame with the target is given to update(), with the time of
+    the frame. predict() returns the estimated x, y and width at any time,
+    so the control loop can run faster than the camera and lead a moving
+    target. When the target is missing in some frames, predict() keeps
+    extrapolating until max_dropout seconds after the target was last seen,
+    then it returns None. Extrapolation is limited to max_dropout seconds.
+
+    alpha (0..1) sets how much a measurement corrects the position, and
+    beta (0..alpha) how much it corrects the velocity: lower values filter
+    more noise, but follow changes slower.
+    """
+    def __init__(self, alpha=0.5, beta=0.1, max_dropout=0.3):
+        self.max_dropout = max_dropout
+        self.x = AlphaBeta(alpha, beta)
+        self.y = AlphaBeta(alpha, beta)
+        self.width = AlphaBeta(alpha, beta)
+        self.time = None
+        self._seen = None
+
+    def reset(self):
+        """Forget the target."""
+        self.time = None
+        self._seen = None
+
+    def update(self, x, y, width, t):
+        """Add measurement of the target at time t (seconds)."""
+        if self.time is None or t - self._seen > self.max_dropout:
+            # New target
+            self.x.reset(x)
+            self.y.reset(y)
+            self.width.reset(width)
+        else:
+            dt = t - self.time
+            self.x.update(x, dt)
+            self.y.update(y, dt)
+            self.width.update(width, dt)
+        self.time = t
+        self._seen = t
+
+    def seen(self, t):
+        """Target is still in view at time t, without new measurement
+        (the camera sent the same data again)."""
+        if self.time is not None:
+            self._seen = t
+
+    def predict(self, t):
+        """Return estimated (x, y, width) at time t, None when lost."""
+        if self.time is None or t - self._seen > self.max_dropout:
+            return None
+        dt = min(t - self.time, self.max_dropout)
+        return self.x.predict(dt), self.y.predict(dt), self.width.predict(dt)
@@ -0,0 +1,246 @@
+""" Transports for I2C communication with Pixy2."""
+import ctypes
+import struct
+from fcntl import ioctl
+
+# I2C constants (see linux/i2c-dev.h and linux/i2c.h)
+I2C_SLAVE = 0x0703      # ioctl request to set the address of the device
+I2C_RDWR = 0x0707       # ioctl request for combined transactions
+I2C_M_RD = 0x0001       # flag for a read message
+SMBUS_BLOCK_MAX = 32    # smbus can't read more bytes in one call
+
+# Capture files of RecordingTransport and ReplayTransport
+CAPTURE_MAGIC = b'PIXY2CAP'
+_RECORD = struct.Struct('<cH')  # operation, length of request
+_LENGTH = struct.Struct('<H')   # length of response
+
+
+class _I2CMsg(ctypes.Structure):
+    _fields_ = [
+        ('addr', ctypes.c_uint16),
+        ('flags', ctypes.c_uint16),
+        ('len', ctypes.c_uint16),
+        ('buf', ctypes.POINTER(ctypes.c_uint8)),
+        ]
+
+
+class _I2CRdwrIoctlData(ctypes.Structure):
+    _fields_ = [
+        ('msgs', ctypes.POINTER(_I2CMsg)),
+        ('nmsgs', ctypes.c_uint32),
+        ]
+
+
+class _Transfer:
+    """Prepared write+read message pair for one request."""
+    def __init__(self, address, request, length):
+        self.write_buf = (ctypes.c_uint8 * len(request)).from_buffer_copy(
+            request)
+        self.read_buf = (ctypes.c_uint8 * length)()
+        self.msgs = (_I2CMsg * 2)(
+            _I2CMsg(address, 0, len(request), self.write_buf),
+            _I2CMsg(address, I2C_M_RD, length, self.read_buf))
+        self.ioctl_data = _I2CRdwrIoctlData(self.msgs, 2)
+
+
+class I2CTransport:
+    """Talk to Pixy2 through the i2c device file (/dev/i2c-N).
+
+    Reads are not limited in size and a request and its response can be
+    done as one combined transaction.
+    """
+    MAX_TRANSFERS = 32
+
+    def __init__(self, bus=3, address=0x54):
+        self.address = address
+        self._dev = open('/dev/i2c-{}'.format(bus), 'r+b', buffering=0)
+        ioctl(self._dev, I2C_SLAVE, address)
+        self._transfers = {}
+
+    def write(self, request):
+        """Write request to Pixy2."""
+        self._dev.write(request)
+
+    def read(self, length):
+        """Read length bytes from Pixy2 in one transfer."""
+        return self._dev.read(length)
+
+    def transfer(self, request, length):
+        """Write request and read length bytes in one transaction."""
+        key = (request, length)
+        transfer = self._transfers.get(key)
+        if transfer is None:
+            if len(self._transfers) >= self.MAX_TRANSFERS:
+                self._transfers.clear()
+            transfer = _Transfer(self.address, request, length)
+            self._transfers[key] = transfer
+        ioctl(self._dev, I2C_RDWR, transfer.ioctl_data)
+        return bytes(transfer.read_buf)
+
+    def close(self):
+        self._dev.close()
+
+
+class SMBusTransport:
+    """Talk to Pixy2 through the smbus module.
+
+    smbus can't do combined transactions, so transfer() is a write
+    followed by reads of at most SMBUS_BLOCK_MAX bytes.
+    """
+    def __init__(self, bus=3, address=0x54):
+        from smbus import SMBus
+        self.address = address
+        self.smbus = SMBus(bus)
+
+    def write(self, request):
+        """Write request to Pixy2."""
+        self.smbus.write_i2c_block_data(self.address, 0, list(request))
+
+    def read(self, length):
+        """Read length bytes from Pixy2 in blocks."""
+        data = bytearray()
+        while len(data) < length:
+            chunk = min(SMBUS_BLOCK_MAX, length - len(data))
+            data += bytes(self.smbus.read_i2c_block_data(self.address,
+                                                         0, chunk))
+        return bytes(data)
+
+    def transfer(self, request, length):
+        """Write request and read length bytes."""
+        self.write(request)
+        return self.read(length)
+
+    def close(self):
+        self.smbus.close()
+
+
+class RecordingTransport:
+    """Pass all communication to transport and record it to a file.
+
+    The file can be replayed with ReplayTransport, so Pixy2 can be used
+    without the camera.
+    """
+    def __init__(self, transport, filename):
+        self.transport = transport
+        self._file = open(filename, 'wb')
+        self._file.write(CAPTURE_MAGIC)
+
+    def _record(self, operation, request, response):
+        self._file.write(_RECORD.pack(operation, len(request)))
+        self._file.write(request)
+        self._file.write(_LENGTH.pack(len(response)))
+        self._file.write(response)
+
+    def write(self, request):
+        self.transport.write(request)
+        self._record(b'w', request, b'')
+
+    def read(self, length):
+        response = self.transport.read(length)
+        self._record(b'r', b'', response)
+        return response
+
+    def transfer(self, request, length):
+        response = self.transport.transfer(request, length)
+        self._record(b't', request, response)
+        return response
+
+    def close(self):
+        self._file.close()
+        self.transport.close()
+
+
+class ReplayTransport:
+    """Replay the communication recorded by RecordingTransport.
+
+    Requests are answered with the next matching record of the recording,
+    other records are skipped. When loop is set, the recording starts
+    again when it is finished.
+    """
+    def __init__(self, filename, loop=False):
+        self.loop = loop
+        self._records = read_capture(filename)
+        self._position = 0
+
+    def _next(self, operation, request):
+        for i in range(0, len(self._records)):
+            if self._position == len(self._records):
+                if not self.loop:
+                    break
+                self._position = 0
+            record = self._records[self._position]
+            self._position += 1
+            if record[0] == operation and record[1] == request:
+                return record[2]
+        raise EOFError('Request {} {} not found in recording'.format(
+            operation, request))
+
+    def write(self, request):
+        self._next(b'w', bytes(request))
+
+    def read(self, length):
+        return self._next(b'r', b'')[:length]
+
+    def transfer(self, request, length):
+        return self._next(b't', bytes(request))[:length]
+
+    def close(self):
+        pass
+
+
+class FakeTransport:
+    """Simulate Pixy2 with a function that creates the responses.
+
+    respond(request) is called for every request and returns the response
+    packet (see make_packet()), or None when there is no response. Reads
+    return the bytes of the last response, like Pixy2 does. Missing bytes
+    are read as zeros.
+    """
+    def __init__(self, respond):
+        self.respond = respond
+        self._response = b''
+
+    def write(self, request):
+        self._response = self.respond(bytes(request)) or b''
+
+    def read(self, length):
+        response = self._response[:length]
+        self._response = self._response[length:]
+        if len(response) < length:
+            response += bytes(length - len(response))
+        return response
+
+    def transfer(self, request, length):
+        self.write(request)
+        return self.read(length)
+
+    def close(self):
+        pass
+
+
+def make_packet(packet_type, payload):
+    """Return a Pixy2 response packet (with checksum) for payload."""
+    payload = bytes(payload)
+    return (bytes((175, 193, packet_type, len(payload)))
+            + _LENGTH.pack(sum(payload) & 0xffff) + payload)
+
+
+def read_capture(filename):
+    """Return list of (operation, request, response) of a capture file."""
+    records = []
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if data[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+        raise ValueError('{} is not a Pixy2 capture file'.format(filename))
+    offset = len(CAPTURE_MAGIC)
+    while offset < len(data):
+        operation, length = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        request = data[offset:offset+length]
+        offset += length
+        length, = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        response = data[offset:offset+length]
+        offset += length
+        records.append((operation, request, response))
+    return records